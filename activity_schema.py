@@ -0,0 +1,79 @@
+# Import required libraries
+import json
+import pandas as pd
+
+# Import shared configuration and functions from other scripts
+from metrics import span, increment
+
+# Compact schemas for activity records, mapping each column to its path in the raw payload and its dtype
+# The "datetime" dtype keeps local wall time without a time zone, "datetime_utc" keeps UTC time zone aware
+GARMIN_SCHEMA = {
+    "activityId": (("activityId",), "Int64"),
+    "activityName": (("activityName",), "string"),
+    "activityTypeKey": (("activityType", "typeKey"), "category"),
+    "startTimeLocal": (("startTimeLocal",), "datetime"),
+    "duration": (("duration",), "float64"),
+    "movingDuration": (("movingDuration",), "float64"),
+    "distance": (("distance",), "float64"),
+    "elevationGain": (("elevationGain",), "float32"),
+    "averageSpeed": (("averageSpeed",), "float32"),
+    "averageHR": (("averageHR",), "float32"),
+    "maxHR": (("maxHR",), "float32"),
+    "calories": (("calories",), "float32"),
+    "laps": (("laps",), "object"),
+}
+
+STRAVA_SCHEMA = {
+    "id": (("id",), "Int64"),
+    "name": (("name",), "string"),
+    "type": (("type",), "category"),
+    "sport_type": (("sport_type",), "category"),
+    "start_date": (("start_date",), "datetime_utc"),
+    "start_date_local": (("start_date_local",), "datetime"),
+    "elapsed_time": (("elapsed_time",), "float64"),
+    "moving_time": (("moving_time",), "float64"),
+    "distance": (("distance",), "float64"),
+    "total_elevation_gain": (("total_elevation_gain",), "float32"),
+    "average_speed": (("average_speed",), "float32"),
+    "average_heartrate": (("average_heartrate",), "float32"),
+    "max_heartrate": (("max_heartrate",), "float32"),
+}
+
+
+def extract(record, column, path):
+    """Return a field from a raw record by its path, or from an already projected record by its column name."""
+    if column in record:
+        return record[column]
+    value = record
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def to_dtype(values, dtype):
+    """Convert a list of extracted values to a series of the given schema dtype."""
+    if dtype in ("datetime", "datetime_utc"):
+        series = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce", utc=True)
+        return series.dt.tz_localize(None) if dtype == "datetime" else series
+    if dtype.startswith(("float", "Int")):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").astype(dtype)
+    return pd.Series(values, dtype=dtype)
+
+
+def project_records(records, schema, keep_raw=False):
+    """Project raw activity records onto a compact schema, optionally keeping other fields as one JSON blob."""
+    records = list(records)
+    increment("records_parsed", len(records))
+    with span("parse_records"):
+        columns = {column: to_dtype([extract(r, column, path) for r in records], dtype) for column, (path, dtype) in schema.items()}
+
+        # Keep everything outside the schema as one compact JSON string per activity
+        if keep_raw:
+            top_level = {path[0] for path, _ in schema.values()} | set(schema)
+            columns["raw"] = pd.Series(
+                [json.dumps({k: v for k, v in r.items() if k not in top_level}, default=str) for r in records], dtype=object
+            )
+
+        return pd.DataFrame(columns)
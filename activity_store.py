@@ -0,0 +1,305 @@
+# Import required libraries
+import json
+import datetime
+import pandas as pd
+
+# Import shared configuration and functions from other scripts
+from config import logger
+from task_tracker import get_connection
+
+# Periods kept in the rollup tables, each mapped to the first day of the period containing a date
+ROLLUP_PERIODS = {
+    "day": lambda day: day,
+    "week": lambda day: day - datetime.timedelta(days=day.weekday()),
+    "month": lambda day: day.replace(day=1),
+}
+
+
+def _json_default(value):
+    """Convert NumPy scalars and other non-JSON values found in dataframe records."""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _date_bounds(start_date, end_date):
+    """Return inclusive start and exclusive end date strings for comparing stored start times."""
+    return start_date.isoformat(), (end_date + datetime.timedelta(days=1)).isoformat()
+
+
+def get_sync_state(source):
+    """Return the synchronised date range for a source as a (synced_from, high_water_mark) tuple."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT synced_from, high_water_mark FROM sync_state WHERE source = ?", (source,)
+        ).fetchone()
+
+    if row is None:
+        return None, None
+    synced_from = datetime.date.fromisoformat(row[0]) if row[0] else None
+    high_water_mark = datetime.date.fromisoformat(row[1]) if row[1] else None
+    return synced_from, high_water_mark
+
+
+def set_sync_state(source, synced_from, high_water_mark):
+    """Record the date range that has been synchronised for a source."""
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO sync_state (source, synced_from, high_water_mark, synced_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(source) DO UPDATE SET
+                synced_from = excluded.synced_from,
+                high_water_mark = excluded.high_water_mark,
+                synced_at = excluded.synced_at
+            """,
+            (source, synced_from.isoformat(), high_water_mark.isoformat()),
+        )
+        conn.commit()
+
+
+def get_cursor(source):
+    """Return the persisted delta sync cursor for a source, or None if it has not synced before."""
+    with get_connection() as conn:
+        row = conn.execute("SELECT cursor FROM sync_state WHERE source = ?", (source,)).fetchone()
+    return row[0] if row else None
+
+
+def set_cursor(source, cursor):
+    """Persist the delta sync cursor for a source."""
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO sync_state (source, cursor, synced_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(source) DO UPDATE SET
+                cursor = excluded.cursor,
+                synced_at = excluded.synced_at
+            """,
+            (source, cursor),
+        )
+        conn.commit()
+
+
+def _activity_rows(source, records, id_key, time_key):
+    """Return rows for the activities table from raw activity records, keeping the last copy of a repeated ID."""
+    # Concurrent offset paging can return the same activity twice, which must only count once in the rollups
+    rows = {
+        str(record[id_key]): (source, str(record[id_key]), str(record.get(time_key) or ""), json.dumps(record, default=_json_default))
+        for record in records
+        if record.get(id_key) is not None
+    }
+    return list(rows.values())
+
+
+def _type_key(value):
+    """Return the activity type key from a nested Garmin activityType dict or a plain type string."""
+    if isinstance(value, dict):
+        value = value.get("typeKey")
+    return value if isinstance(value, str) and value else None
+
+
+def _number(value):
+    """Return a value as a float, treating missing and NaN values from dataframe records as zero."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if number != number else number
+
+
+def activity_contributions(record):
+    """Return the (activity_type, distance, duration) totals an activity adds, counting multisport laps under their own type."""
+    activity_type = _type_key(record.get("activityType")) or _type_key(record.get("activityTypeKey")) or _type_key(record.get("type"))
+    if activity_type is None:
+        return []
+
+    duration = record.get("duration", record.get("moving_time"))
+    contributions = [(activity_type, _number(record.get("distance")), _number(duration))]
+
+    # Multisport legs are also counted under their lap type, so a triathlon run adds to the running totals
+    if activity_type == "multisport" and isinstance(record.get("laps"), list):
+        legs = {}
+        for lap in record["laps"]:
+            if not isinstance(lap, dict):
+                continue
+            lap_type = _type_key(lap.get("activityType")) or _type_key(lap.get("activityTypeKey"))
+            if lap_type is None:
+                continue
+            distance, duration = legs.get(lap_type.lower(), (0.0, 0.0))
+            legs[lap_type.lower()] = (distance + _number(lap.get("distance")), duration + _number(lap.get("duration")))
+        contributions.extend((lap_type, distance, duration) for lap_type, (distance, duration) in legs.items() if distance > 0)
+
+    return contributions
+
+
+def _rollup_deltas(rows, sign, deltas):
+    """Add the signed contributions of (start_time, payload) rows to a dict of rollup deltas per period."""
+    for start_time, payload in rows:
+        try:
+            day = datetime.date.fromisoformat(start_time[:10])
+        except (TypeError, ValueError):
+            continue
+        record = json.loads(payload) if isinstance(payload, str) else payload
+        for activity_type, distance, duration in activity_contributions(record):
+            for period, period_start in ROLLUP_PERIODS.items():
+                key = (period, period_start(day).isoformat(), activity_type)
+                count, total_distance, total_duration = deltas.get(key, (0, 0.0, 0.0))
+                deltas[key] = (count + sign, total_distance + sign * distance, total_duration + sign * duration)
+    return deltas
+
+
+def _apply_rollups(conn, source, old_rows, new_rows):
+    """Update the rollup tables by removing the totals of replaced activities and adding those of their replacements."""
+    deltas = _rollup_deltas(old_rows, -1, {})
+    deltas = _rollup_deltas(new_rows, 1, deltas)
+    conn.executemany(
+        """
+        INSERT INTO activity_rollups (source, period, period_start, activity_type, activity_count, distance, duration)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(source, period, period_start, activity_type) DO UPDATE SET
+            activity_count = activity_count + excluded.activity_count,
+            distance = distance + excluded.distance,
+            duration = duration + excluded.duration
+        """,
+        [(source, *key, *totals) for key, totals in deltas.items() if any(totals)],
+    )
+    conn.execute("DELETE FROM activity_rollups WHERE source = ? AND activity_count <= 0", (source,))
+
+
+def _stored_rows(conn, source, activity_ids, lower=None, upper=None):
+    """Return (start_time, payload) of stored activities with the given IDs, or within an optional date range."""
+    query = "SELECT start_time, payload FROM activities WHERE source = ? AND (activity_id IN (SELECT value FROM json_each(?))"
+    params = [source, json.dumps(activity_ids)]
+    if lower is not None:
+        query += " OR (start_time >= ? AND start_time < ?)"
+        params += [lower, upper]
+    return conn.execute(query + ")", params).fetchall()
+
+
+def _upsert_rows(conn, rows):
+    """Insert or update activity rows on an open connection."""
+    conn.executemany(
+        """
+        INSERT INTO activities (source, activity_id, start_time, payload, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source, activity_id) DO UPDATE SET
+            start_time = excluded.start_time,
+            payload = excluded.payload,
+            updated_at = excluded.updated_at
+        """,
+        rows,
+    )
+
+
+def upsert_activities(source, records, id_key, time_key):
+    """Merge fetched activity records into the local store, keeping all other stored activities."""
+    rows = _activity_rows(source, records, id_key, time_key)
+    with get_connection() as conn:
+        old_rows = _stored_rows(conn, source, [row[1] for row in rows])
+        _apply_rollups(conn, source, old_rows, [(row[2], row[3]) for row in rows])
+        _upsert_rows(conn, rows)
+        conn.commit()
+
+    logger.info("Merged %d %s activities into the local store", len(rows), source)
+    return len(rows)
+
+
+def replace_activities(source, records, start_date, end_date, id_key, time_key):
+    """Replace the stored activities for a source within a date range with freshly fetched records."""
+    lower, upper = _date_bounds(start_date, end_date)
+    rows = _activity_rows(source, records, id_key, time_key)
+
+    with get_connection() as conn:
+        old_rows = _stored_rows(conn, source, [row[1] for row in rows], lower, upper)
+        _apply_rollups(conn, source, old_rows, [(row[2], row[3]) for row in rows])
+
+        # Drop the refetched range first, so activities deleted upstream also disappear locally
+        conn.execute(
+            "DELETE FROM activities WHERE source = ? AND start_time >= ? AND start_time < ?",
+            (source, lower, upper),
+        )
+        _upsert_rows(conn, rows)
+        conn.commit()
+
+    logger.info("Stored %d %s activities from %s to %s", len(rows), source, start_date, end_date)
+    return len(rows)
+
+
+def load_activity_records(source, start_date, end_date):
+    """Load stored raw activity records for a source within a date range, newest first."""
+    lower, upper = _date_bounds(start_date, end_date)
+    with get_connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT payload FROM activities
+            WHERE source = ? AND start_time >= ? AND start_time < ?
+            ORDER BY start_time DESC
+            """,
+            (source, lower, upper),
+        ).fetchall()
+
+    return [json.loads(payload) for (payload,) in rows]
+
+
+def rebuild_rollups(source):
+    """Recompute the rollup tables of a source from every stored activity, used for stores created before rollups."""
+    with get_connection() as conn:
+        rows = conn.execute("SELECT start_time, payload FROM activities WHERE source = ?", (source,)).fetchall()
+        conn.execute("DELETE FROM activity_rollups WHERE source = ?", (source,))
+        _apply_rollups(conn, source, [], rows)
+        conn.commit()
+
+    logger.info("Rebuilt activity rollups for %s from %d stored activities", source, len(rows))
+
+
+def load_rollups(source, period, start_date, end_date, activity_types=None):
+    """Load rollup totals for a source as a dataframe with one row per period and activity type."""
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"Unknown rollup period: {period}")
+
+    with get_connection() as conn:
+        # Fill the rollups once for activities stored before the rollup tables existed
+        has_rollups = conn.execute("SELECT EXISTS (SELECT 1 FROM activity_rollups WHERE source = ?)", (source,)).fetchone()[0]
+        has_activities = conn.execute("SELECT EXISTS (SELECT 1 FROM activities WHERE source = ?)", (source,)).fetchone()[0]
+    if has_activities and not has_rollups:
+        rebuild_rollups(source)
+
+    query = """
+        SELECT period_start, activity_type, activity_count, distance, duration FROM activity_rollups
+        WHERE source = ? AND period = ? AND period_start >= ? AND period_start <= ?
+    """
+    params = [source, period, start_date.isoformat(), end_date.isoformat()]
+    if activity_types is not None:
+        query += " AND activity_type IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(activity_types)))
+
+    with get_connection() as conn:
+        rows = conn.execute(query + " ORDER BY period_start, activity_type", params).fetchall()
+
+    df = pd.DataFrame(rows, columns=["period_start", "activity_type", "activity_count", "distance", "duration"])
+    df["period_start"] = pd.to_datetime(df["period_start"])
+    return df
+
+
+def ranges_to_fetch(source, start_date, end_date, overlap_days):
+    """Return the date ranges missing from the local store, plus an overlap window for late edits."""
+    synced_from, high_water_mark = get_sync_state(source)
+    if synced_from is None or high_water_mark is None:
+        return [(start_date, end_date)]
+
+    ranges = []
+
+    # Extend coverage backwards if an older range is requested than synced before
+    if start_date < synced_from:
+        ranges.append((start_date, synced_from - datetime.timedelta(days=1)))
+
+    # Refetch from the high-water mark minus overlap, to pick up new and recently edited activities
+    # A range starting after the high-water mark is fetched from it too, so the synced range stays without gaps
+    refetch_from = high_water_mark - datetime.timedelta(days=overlap_days)
+    if start_date <= high_water_mark:
+        refetch_from = max(refetch_from, start_date)
+    if refetch_from <= end_date:
+        ranges.append((refetch_from, end_date))
+
+    return ranges
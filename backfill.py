@@ -0,0 +1,107 @@
+# Import required libraries
+import time
+import datetime
+import argparse
+import requests
+
+# Import shared configuration and functions from other scripts
+from config import logger, configure_logging
+from rate_limit import is_rate_limited
+from task_tracker import init_db, completed_slices, mark_slice_completed
+from activity_store import get_sync_state, set_sync_state, upsert_activities
+from garmin_connect import iter_activity_chunks, check_garmin_credentials
+from strava import fetch_activities_after
+from metrics import run_metrics
+
+# Default number of days fetched per checkpointed slice
+SLICE_DAYS = 30
+
+
+def date_slices(start_date, end_date, slice_days=SLICE_DAYS):
+    """Split a date range into consecutive (start, end) slices of at most slice_days days, oldest first."""
+    slice_start = start_date
+    while slice_start <= end_date:
+        slice_end = min(slice_start + datetime.timedelta(days=slice_days - 1), end_date)
+        yield slice_start, slice_end
+        slice_start = slice_end + datetime.timedelta(days=1)
+
+
+def backfill_garmin_slice(slice_start, slice_end, creds):
+    """Fetch one date slice of Garmin Connect activities in chunks and merge them into the local store."""
+    count = 0
+    for chunk in iter_activity_chunks(slice_start, slice_end, creds, compact=False):
+        count += upsert_activities("garmin", chunk.to_dict("records"), "activityId", "startTimeLocal")
+    return count
+
+
+def backfill_strava_slice(slice_start, slice_end):
+    """Fetch one date slice of Strava activities and merge them into the local store."""
+    after = int(datetime.datetime.combine(slice_start, datetime.time.min).timestamp())
+    before = int(datetime.datetime.combine(slice_end + datetime.timedelta(days=1), datetime.time.min).timestamp())
+    activities = fetch_activities_after(after, before)
+    return upsert_activities("strava", activities, "id", "start_date_local")
+
+
+def extend_coverage(source, start_date, end_date):
+    """Extend the synchronised date range of a source with a backfilled range, if the two ranges connect."""
+    synced_from, high_water_mark = get_sync_state(source)
+    if synced_from is None or high_water_mark is None:
+        set_sync_state(source, start_date, end_date)
+    elif start_date <= high_water_mark + datetime.timedelta(days=1) and end_date >= synced_from - datetime.timedelta(days=1):
+        set_sync_state(source, min(synced_from, start_date), max(high_water_mark, end_date))
+
+
+def backfill(start_date, end_date, sources=("garmin", "strava"), slice_days=SLICE_DAYS):
+    """Ingest activity history slice by slice, skipping slices already checkpointed, and return the number stored."""
+    init_db()
+    garmin_creds = check_garmin_credentials() if "garmin" in sources else None
+    fetchers = {
+        "garmin": lambda s, e: backfill_garmin_slice(s, e, garmin_creds),
+        "strava": backfill_strava_slice,
+    }
+
+    total = 0
+    started = time.monotonic()
+    for source in sources:
+        done = completed_slices(source)
+        slices = list(date_slices(start_date, end_date, slice_days))
+        pending = [(s, e) for s, e in slices if (s.isoformat(), e.isoformat()) not in done]
+        logger.info("Backfilling %s from %s to %s, %d of %d slices left", source, start_date, end_date, len(pending), len(slices))
+
+        for slice_start, slice_end in pending:
+            try:
+                count = fetchers[source](slice_start, slice_end)
+            except (RuntimeError, requests.HTTPError) as e:
+                if not is_rate_limited(e):
+                    raise
+                # Stop cleanly on rate limits, finished slices are checkpointed and skipped on the next run
+                logger.warning("Rate limited by %s at slice %s to %s, run the backfill again later to resume", source, slice_start, slice_end)
+                return total
+
+            mark_slice_completed(source, slice_start.isoformat(), slice_end.isoformat(), count)
+            total += count
+            elapsed = max(time.monotonic() - started, 1e-9)
+            logger.info(
+                "Backfilled %s %s to %s: %d activities, %d in total at %.1f activities/s",
+                source, slice_start, slice_end, count, total, total / elapsed,
+            )
+
+        extend_coverage(source, start_date, end_date)
+
+    logger.info("Backfill complete, stored %d activities in %.1f seconds", total, time.monotonic() - started)
+    return total
+
+
+if __name__ == "__main__":
+    configure_logging()
+    today = datetime.date.today()
+    parser = argparse.ArgumentParser(description="Backfill Garmin Connect and Strava activity history into the local store")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, default=datetime.date(today.year - 5, 1, 1),
+                        help="First date to backfill, as YYYY-MM-DD (default five years ago)")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, default=today, help="Last date to backfill, as YYYY-MM-DD (default today)")
+    parser.add_argument("--sources", nargs="+", choices=["garmin", "strava"], default=["garmin", "strava"], help="Sources to backfill")
+    parser.add_argument("--slice-days", type=int, default=SLICE_DAYS, help="Number of days fetched per checkpointed slice")
+    args = parser.parse_args()
+
+    with run_metrics("backfill"):
+        backfill(args.start, args.end, sources=args.sources, slice_days=args.slice_days)
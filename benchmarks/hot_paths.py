@@ -0,0 +1,192 @@
+# Import required libraries
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+
+# Draw figures off screen, as the benchmark only saves them
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+# Ensure parent directory is on sys path so it can import script functionality
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# Import shared configuration and functions from other scripts
+import numpy as np
+import pandas as pd
+import task_tracker
+from activity_schema import GARMIN_SCHEMA, STRAVA_SCHEMA, project_records
+from activity_store import upsert_activities
+from garmin_connect import prepare_dataframe
+from dashboard import filter_running_activities, extract_multisport_running, running_summary, render_dashboard, load_pyplot
+from compare_strava_garmin import normalise_garmin, normalise_strava, match_activities
+from benchmarks.synthetic import SIZES, generate_garmin_activities, generate_strava_activities
+
+# Directory where benchmark results are saved for later comparison
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def measure(fn, repeat=1, memory=True):
+    """Return the median wall time in seconds of a stage, and its peak traced memory in MB from a separate run."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    # Trace memory in its own run, so the tracing overhead does not skew the timings
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+
+    return statistics.median(timings), peak_mb
+
+
+def use_database(path):
+    """Point the tracker database at a path, creating its tables, and close the connection to the previous one."""
+    task_tracker.close_connection()
+    task_tracker.DB_PATH = path
+    task_tracker.init_db()
+
+
+def build_stages(garmin_records, strava_records, work_dir, prefill=True):
+    """Return the analysis stages to measure, in pipeline order, as (name, function) pairs.
+    The work database is filled with the activities first when prefill is set, for the stages reading the rollups."""
+    garmin_df = project_records(garmin_records, GARMIN_SCHEMA)
+    strava_df = project_records(strava_records, STRAVA_SCHEMA)
+    first_day = garmin_df["startTimeLocal"].min().date()
+    last_day = garmin_df["startTimeLocal"].max().date()
+    store_runs = []
+
+    # Point every stage at a work database holding the activities, never at the real tracker database
+    work_db = os.path.join(work_dir, "work.db")
+    use_database(work_db)
+    if prefill:
+        upsert_activities("garmin", garmin_records, "activityId", "startTimeLocal")
+
+    def store():
+        # Each run stores into a fresh database, so every run measures inserts and rollup updates alike
+        use_database(os.path.join(work_dir, f"store_{len(store_runs)}.db"))
+        store_runs.append(task_tracker.DB_PATH)
+        try:
+            upsert_activities("garmin", garmin_records, "activityId", "startTimeLocal")
+        finally:
+            use_database(work_db)
+
+    def render():
+        # A sample without runs has nothing to draw
+        summary = running_summary(first_day, last_day)
+        if summary is None:
+            return
+        total_km, monthly, cumulative, type_counts = summary
+        render_dashboard(os.path.join(work_dir, "run_distance.png"), last_day.year, total_km, monthly, cumulative, type_counts, show_plot=False)
+
+    return [
+        ("project_garmin_schema", lambda: project_records(garmin_records, GARMIN_SCHEMA)),
+        ("project_strava_schema", lambda: project_records(strava_records, STRAVA_SCHEMA)),
+        ("prepare_dataframe", lambda: prepare_dataframe(garmin_df)),
+        ("filter_running_activities", lambda: filter_running_activities(garmin_df)),
+        ("extract_multisport_running", lambda: extract_multisport_running(garmin_df)),
+        ("match_activities", lambda: match_activities(normalise_garmin(garmin_df), normalise_strava(strava_df))),
+        ("store_with_rollups", store),
+        ("running_summary", lambda: running_summary(first_day, last_day)),
+        ("render_dashboard", render),
+    ]
+
+
+def run(sizes=SIZES, repeat=1, memory=True, stages=None):
+    """Generate synthetic activities for each size, measure every stage and return the results."""
+    results = []
+    original_db_path = task_tracker.DB_PATH
+
+    # Only fill the work database up front when a stage reads the rollups, as storing a million activities takes a while
+    prefill = not stages or bool({"running_summary", "render_dashboard"} & set(stages))
+
+    # Load matplotlib up front, so its import time is not counted as rendering time of the first size
+    if not stages or "render_dashboard" in stages:
+        load_pyplot()
+
+    try:
+        for size in sizes:
+            started = time.perf_counter()
+            garmin_records = generate_garmin_activities(size)
+            strava_records = generate_strava_activities(garmin_records)
+            print(f"Generated {size:,} Garmin Connect and {len(strava_records):,} Strava activities in {time.perf_counter() - started:.1f} s")
+
+            with tempfile.TemporaryDirectory() as work_dir:
+                for name, fn in build_stages(garmin_records, strava_records, work_dir, prefill):
+                    if stages and name not in stages:
+                        continue
+                    seconds, peak_mb = measure(fn, repeat, memory)
+                    results.append({"size": size, "stage": name, "seconds": seconds, "peak_mb": peak_mb})
+                    memory_text = f"{peak_mb:10.1f} MB" if peak_mb is not None else f"{'-':>13}"
+                    print(f"{size:>10,}  {name:<28} {seconds * 1000:12.1f} ms {memory_text}")
+                task_tracker.close_connection()
+    finally:
+        task_tracker.close_connection()
+        task_tracker.DB_PATH = original_db_path
+    return results
+
+
+def environment():
+    """Return the interpreter, library versions and commit the results were measured with."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "commit": commit or None,
+    }
+
+
+def compare(results, baseline_path):
+    """Print the time and memory of each stage relative to a saved baseline run."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["size"], r["stage"]): r for r in json.load(f)["results"]}
+
+    print(f"\nCompared to {baseline_path}:")
+    for result in results:
+        before = baseline.get((result["size"], result["stage"]))
+        if before is None:
+            continue
+        time_ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("nan")
+        memory_ratio = result["peak_mb"] / before["peak_mb"] if result["peak_mb"] and before.get("peak_mb") else float("nan")
+        print(f"{result['size']:>10,}  {result['stage']:<28} time x{time_ratio:5.2f}  memory x{memory_ratio:5.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure time and peak memory of the analysis hot paths on synthetic activities")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES), help="Numbers of activities to generate (default 1k, 100k and 1M)")
+    parser.add_argument("--stages", nargs="+", help="Only measure the named stages")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of timed runs per stage, the median is reported")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the separate run measuring peak memory")
+    parser.add_argument("--output", help="Path to save the results as JSON (default benchmarks/results/hot_paths-<time>.json)")
+    parser.add_argument("--compare", help="Path to earlier results to compare against")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, not args.no_memory, args.stages)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"hot_paths-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"created_at": datetime.datetime.now().isoformat(), "environment": environment(), "results": results}, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,87 @@
+# Import required libraries
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Repository root, so entry points are imported the same way as when run from the project directory
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Import time budget in seconds per entry point, excluding interpreter startup
+STARTUP_BUDGETS = {
+    "config": 0.15,
+    "garmin_connect": 1.5,
+    "strava": 1.2,
+    "strava_garmin_sync": 1.8,
+    "compare_strava_garmin": 1.8,
+    "dashboard": 1.8,
+    "weekly_report": 1.8,
+    "backfill": 1.8,
+}
+
+# Modules that should only be loaded on the code paths that draw plots or drive a browser
+HEAVY_MODULES = ("matplotlib", "seaborn", "selenium")
+
+# Snippet run in a fresh interpreter, printing the import time and the heavy modules it loaded
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure(module, repeat=5):
+    """Import a module in fresh interpreters and return the median import time and heavy modules loaded."""
+    timings, heavy = [], []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+            return {"module": module, "error": error}
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(sample["seconds"])
+        heavy = sample["heavy"]
+
+    return {"module": module, "seconds": statistics.median(timings), "heavy": heavy}
+
+
+def run(modules, repeat=5):
+    """Measure each entry point against its budget and return the results and whether all of them passed."""
+    results, passed = [], True
+    for module in modules:
+        result = measure(module, repeat)
+        budget = STARTUP_BUDGETS.get(module)
+        if "error" in result:
+            result["ok"] = False
+            print(f"{module:<24} failed to import: {result['error']}")
+        else:
+            result["budget"] = budget
+            result["ok"] = (budget is None or result["seconds"] <= budget) and not result["heavy"]
+            heavy = ", ".join(result["heavy"]) or "-"
+            status = "ok" if result["ok"] else "OVER BUDGET"
+            print(f"{module:<24} {result['seconds'] * 1000:8.1f} ms  budget {budget * 1000 if budget else 0:8.1f} ms  heavy: {heavy:<28} {status}")
+        passed = passed and result["ok"]
+        results.append(result)
+    return results, passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import time of each entry point against its startup budget")
+    parser.add_argument("modules", nargs="*", default=list(STARTUP_BUDGETS), help="Entry point modules to measure (default all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreters per module, the median is reported")
+    parser.add_argument("--output", help="Optional path to save the results as JSON")
+    args = parser.parse_args()
+
+    results, passed = run(args.modules, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,110 @@
+# Import required libraries
+import datetime
+import numpy as np
+
+# Garmin Connect activity types with their share of a mixed training log, mean speed in m/s and Strava type
+ACTIVITY_MIX = {
+    "running": (0.30, 2.9, "Run"),
+    "trail_running": (0.05, 2.4, "Run"),
+    "treadmill_running": (0.04, 2.8, "Run"),
+    "road_biking": (0.15, 7.5, "Ride"),
+    "indoor_cycling": (0.08, 8.5, "VirtualRide"),
+    "walking": (0.10, 1.4, "Walk"),
+    "hiking": (0.04, 1.1, "Hike"),
+    "strength_training": (0.10, 0.0, "WeightTraining"),
+    "lap_swimming": (0.05, 0.7, "Swim"),
+    "yoga": (0.03, 0.0, "Yoga"),
+    "multisport": (0.03, 4.0, "Workout"),
+    "other": (0.03, 0.0, "Workout"),
+}
+
+# Legs of a synthetic triathlon, as (lap type key, distance in metres, speed in m/s)
+TRIATHLON_LEGS = [("lap_swimming", 1500, 0.7), ("transition", 0, 0.0), ("cycling", 40000, 8.0), ("transition", 0, 0.0), ("running", 10000, 2.8)]
+
+# Activity sizes measured by default, from a typical account to far beyond any single athlete
+SIZES = (1_000, 100_000, 1_000_000)
+
+
+def start_times(rng, n, start, days):
+    """Return n sorted activity start times spread over a number of days from a start time."""
+    offsets = np.sort(rng.integers(0, days * 24 * 60 * 60, size=n))
+    return [start + datetime.timedelta(seconds=int(offset)) for offset in offsets]
+
+
+def triathlon_laps(rng):
+    """Return the laps of one triathlon with nested activityType dicts, shaped like Garmin Connect multisport laps."""
+    laps = []
+    for type_key, distance, speed in TRIATHLON_LEGS:
+        distance = float(distance * rng.uniform(0.95, 1.05))
+        laps.append({
+            "activityType": {"typeKey": type_key},
+            "distance": distance,
+            "duration": distance / speed if speed else float(rng.uniform(60, 240)),
+        })
+    return laps
+
+
+def generate_garmin_activities(n, seed=0, start=datetime.datetime(2020, 1, 1), days=5 * 365):
+    """Generate n Garmin Connect activity payloads with nested activity types, laps and a realistic sport mix."""
+    rng = np.random.default_rng(seed)
+    type_keys = list(ACTIVITY_MIX)
+    types = rng.choice(len(type_keys), size=n, p=[ACTIVITY_MIX[k][0] for k in type_keys])
+    durations = rng.gamma(4, 900, size=n)
+    heart_rates = rng.normal(140, 12, size=n)
+
+    activities = []
+    for i, started in enumerate(start_times(rng, n, start, days)):
+        type_key = type_keys[types[i]]
+        _, speed, _ = ACTIVITY_MIX[type_key]
+        activity = {
+            "activityId": 10_000_000_000 + i,
+            "activityName": f"{type_key.replace('_', ' ').title()} {i}",
+            "activityType": {"typeId": int(types[i]) + 1, "typeKey": type_key, "parentTypeId": 17},
+            "startTimeLocal": started.strftime("%Y-%m-%d %H:%M:%S"),
+            "startTimeGMT": (started - datetime.timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S"),
+            "duration": float(durations[i]),
+            "movingDuration": float(durations[i] * 0.95),
+            "distance": float(durations[i] * speed) if speed else None,
+            "averageSpeed": speed or None,
+            "averageHR": float(heart_rates[i]),
+            "maxHR": float(heart_rates[i] + 25),
+            "calories": float(durations[i] / 6),
+            "elevationGain": float(rng.gamma(2, 40)) if speed else None,
+        }
+        if type_key == "multisport":
+            activity["laps"] = triathlon_laps(rng)
+            activity["distance"] = sum(lap["distance"] for lap in activity["laps"])
+            activity["duration"] = sum(lap["duration"] for lap in activity["laps"])
+        activities.append(activity)
+    return activities
+
+
+def generate_strava_activities(garmin_activities, share=0.9, seed=1):
+    """Generate Strava payloads mirroring a share of Garmin Connect activities, with clock skew and small distance differences."""
+    rng = np.random.default_rng(seed)
+    mirrored = rng.random(len(garmin_activities)) < share
+    skews = rng.integers(-20, 21, size=len(garmin_activities))
+    scales = rng.uniform(0.995, 1.005, size=len(garmin_activities))
+
+    activities = []
+    for i, garmin in enumerate(garmin_activities):
+        if not mirrored[i]:
+            continue
+        started = datetime.datetime.strptime(garmin["startTimeLocal"], "%Y-%m-%d %H:%M:%S") + datetime.timedelta(seconds=int(skews[i]))
+        strava_type = ACTIVITY_MIX[garmin["activityType"]["typeKey"]][2]
+        activities.append({
+            "id": 20_000_000_000 + i,
+            "name": garmin["activityName"],
+            "type": strava_type,
+            "sport_type": strava_type,
+            "start_date": started.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "start_date_local": started.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "elapsed_time": round(garmin["duration"]),
+            "moving_time": round(garmin["movingDuration"]),
+            "distance": garmin["distance"] * scales[i] if garmin["distance"] else 0.0,
+            "total_elevation_gain": garmin["elevationGain"] or 0.0,
+            "average_speed": garmin["averageSpeed"] or 0.0,
+            "average_heartrate": garmin["averageHR"],
+            "max_heartrate": garmin["maxHR"],
+        })
+    return activities
@@ -1,60 +1,110 @@
 # Import required libraries
-import datetime
+import numpy as np
 import pandas as pd
 
 # Import shared configuration and functions from other scripts
-from config import logger, ACTIVITY_DAYS_RANGE
-from garmin_connect import fetch_data
-from strava import get_latest_activities
+from config import logger, configure_logging, ACTIVITY_DAYS_RANGE
+from cross_source import fetch_garmin_and_strava
+from metrics import run_metrics
+
+# Largest start time difference at which two activities can still be the same one
+MATCH_TOLERANCE = pd.Timedelta(minutes=2)
+
+# Lowest confidence at which a time match also has to agree on duration and distance
+MIN_MATCH_CONFIDENCE = 0.5
+
+
+def select_columns(df, columns):
+    """Return the given columns of a dataframe under new names, filling any missing column with NaN."""
+    return pd.DataFrame({new: df[old] if old in df.columns else np.nan for old, new in columns.items()}, index=df.index)
 
 
 def normalise_garmin(df):
-    """Normalise Garmin Connect dataframe timestamps for comparison."""
-    if df.empty:
-        return df
-    df = df[['activityName', 'startTimeLocal']].copy()
-    df['startTimeLocal'] = pd.to_datetime(df['startTimeLocal']).dt.tz_localize(None).dt.floor('min')
+    """Normalise Garmin Connect dataframe to common columns for matching."""
+    df = select_columns(df, {'activityId': 'id', 'activityName': 'name', 'startTimeLocal': 'start',
+                             'duration': 'duration', 'distance': 'distance'})
+    df['start'] = pd.to_datetime(df['start']).dt.tz_localize(None).astype('datetime64[ns]')
     return df
 
 
 def normalise_strava(df):
-    """Normalise Strava dataframe timestamps for comparison."""
-    if df.empty:
-        return df
-    df = df[['name', 'start_date_local']].copy()
-    df['start_date_local'] = pd.to_datetime(df['start_date_local']).dt.tz_localize(None).dt.floor('min')
+    """Normalise Strava dataframe to common columns for matching."""
+    df = select_columns(df, {'id': 'id', 'name': 'name', 'start_date_local': 'start',
+                             'elapsed_time': 'duration', 'distance': 'distance'})
+    df['start'] = pd.to_datetime(df['start']).dt.tz_localize(None).astype('datetime64[ns]')
     return df
 
 
+def similarity(a, b):
+    """Return how closely two positive quantities agree from 0 to 1, or NaN if either is missing."""
+    a = pd.to_numeric(a, errors='coerce')
+    b = pd.to_numeric(b, errors='coerce')
+    largest = np.maximum(a, b)
+    score = 1 - (a - b).abs() / largest.where(largest > 0)
+    return score.clip(lower=0)
+
+
+def match_activities(garmin_df, strava_df, tolerance=MATCH_TOLERANCE, min_confidence=MIN_MATCH_CONFIDENCE):
+    """Match normalised Garmin Connect and Strava activities by nearest start time within a tolerance."""
+    garmin = garmin_df.dropna(subset=['start']).sort_values('start').reset_index(drop=True)
+    strava = strava_df.dropna(subset=['start']).sort_values('start').reset_index(drop=True)
+    strava['strava_row'] = strava.index
+
+    # Sorted as-of join, pairing each Garmin Connect activity with the nearest Strava start time
+    merged = pd.merge_asof(
+        garmin.add_prefix('garmin_'), strava.add_prefix('strava_').rename(columns={'strava_strava_row': 'strava_row'}),
+        left_on='garmin_start', right_on='strava_start', direction='nearest', tolerance=tolerance,
+    )
+    merged = merged.dropna(subset=['strava_row'])
+
+    # Confidence combines start time distance with agreement on duration and distance where both are known
+    time_score = 1 - (merged['garmin_start'] - merged['strava_start']).abs() / tolerance
+    scores = pd.concat([
+        time_score,
+        similarity(merged['garmin_duration'], merged['strava_duration']),
+        similarity(merged['garmin_distance'], merged['strava_distance']),
+    ], axis=1)
+    merged['confidence'] = scores.mean(axis=1, skipna=True)
+    merged = merged[merged['confidence'] >= min_confidence]
+
+    # Each Strava activity can only match once, keep its most confident Garmin Connect match
+    merged = merged.sort_values('confidence', ascending=False).drop_duplicates('strava_row').sort_values('garmin_start')
+
+    matched_garmin = set(merged['garmin_id'])
+    matched_strava = set(merged['strava_row'].astype(int))
+    return {
+        'matched': merged.drop(columns='strava_row').reset_index(drop=True),
+        'garmin_only': garmin[~garmin['id'].isin(matched_garmin)].reset_index(drop=True),
+        'strava_only': strava[~strava['strava_row'].isin(matched_strava)].drop(columns='strava_row').reset_index(drop=True),
+    }
+
+
 def main(days=ACTIVITY_DAYS_RANGE):
     """Compare activities from Garmin Connect to Strava by start time and report missing items."""
     logger.info("Comparing activities from Garmin Connect to Strava for the past %d days", days)
     
-    # Fetch the activities from Garmin
-    end_date = datetime.date.today()
-    start_date = end_date - datetime.timedelta(days=days)
-    _, garmin_df = fetch_data(start_date, end_date)
+    # Fetch the activities from Garmin Connect and Strava at the same time
+    garmin_df, strava_df = fetch_garmin_and_strava(days)
     garmin_df = normalise_garmin(garmin_df)
-
-    # Fetch the activities from Strava
-    strava_df = get_latest_activities(days=days)
     strava_df = normalise_strava(strava_df)
 
-    # Compare by start time only
-    garmin_times = set(garmin_df['startTimeLocal'].dropna())
-    strava_times = set(strava_df['start_date_local'].dropna())
-
-    missing_times = garmin_times - strava_times
-    logger.info("Garmin Connect activity times not found on Strava: %s", missing_times)
+    # Match by nearest start time, checked against duration and distance
+    result = match_activities(garmin_df, strava_df)
+    missing = result['garmin_only']
+    logger.info(
+        "Matched %d activities, %d only on Garmin Connect, %d only on Strava",
+        len(result['matched']), len(missing), len(result['strava_only']),
+    )
 
-    if missing_times:
+    if not missing.empty:
         print("The following activities are available Garmin Connect, but not in Strava:")
-        for ts in sorted(missing_times):
-            row = garmin_df[garmin_df['startTimeLocal'] == ts].iloc[0]
-            print(f" - {row['activityName']} at {ts.strftime('%d-%m-%Y %H:%M')}")
+        for row in missing.itertuples(index=False):
+            print(f" - {row.name} at {row.start.strftime('%d-%m-%Y %H:%M')}")
     else:
         print("All activities from Garmin Connect are present on Strava")
 
 
 if __name__ == "__main__":
-    main()
+    configure_logging()
+    with run_metrics("compare_strava_garmin"):
+        main()
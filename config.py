@@ -7,24 +7,20 @@ from dotenv import load_dotenv
 # Load environment variables from environment file
 load_dotenv()
 
-# Import shared configuration and functions from other scripts
-from utils import ensure_dir
-
-# Ensure project graphics directory exist
+# Project graphics directory, holding the logo
 PLOTS_DIR = "graphics"
-ensure_dir(PLOTS_DIR)
 
-# Ensure project outputs directory exist
+# Project outputs directory, created when the first output is written
 OUTPUTS_DIR = Path("outputs")
-ensure_dir(OUTPUTS_DIR)
+
+# Local cache directory for downloaded data, such as activity streams
+CACHE_DIR = Path(os.getenv("CACHE_DIR", "cache"))
 
 # Path to logo used in plots
 LOGO_PATH = os.path.join(PLOTS_DIR, "app-logo-1.png")
 
-# Set up logging for information
+# Set up logging for information, handlers are configured by the entry points
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
-numeric_level = getattr(logging, LOG_LEVEL, logging.INFO)
-logging.basicConfig(level=numeric_level)
 logger = logging.getLogger(__name__)
 
 # Detect whether running inside GitHub Actions
@@ -43,6 +39,43 @@ DEBUG_SCREENSHOTS = os.getenv("DEBUG_SCREENSHOTS", "OFF").upper() == "ON"
 # Set how many days back to fetch activities
 ACTIVITY_DAYS_RANGE = int(os.getenv("ACTIVITY_DAYS_RANGE", 7))
 
+# Set how many Strava API pages or downloads to fetch concurrently
+STRAVA_MAX_WORKERS = int(os.getenv("STRAVA_MAX_WORKERS", 4))
+
+# Set how many activity files to upload to Garmin Connect concurrently
+GARMIN_UPLOAD_WORKERS = int(os.getenv("GARMIN_UPLOAD_WORKERS", 2))
+
+# Set how many days before the last sync to refetch, to pick up late edits to activities
+SYNC_OVERLAP_DAYS = int(os.getenv("SYNC_OVERLAP_DAYS", 3))
+
+# Set the request budgets shared by every script, per 15 minutes and per day for Strava
+STRAVA_RATE_LIMIT_15MIN = int(os.getenv("STRAVA_RATE_LIMIT_15MIN", 100))
+STRAVA_RATE_LIMIT_DAILY = int(os.getenv("STRAVA_RATE_LIMIT_DAILY", 1000))
+GARMIN_RATE_LIMIT_15MIN = int(os.getenv("GARMIN_RATE_LIMIT_15MIN", 100))
+
+# Set the longest wait in seconds for the shared request budget before a job is deferred instead
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 900))
+
+# Set the API response cache mode: off, cache (reuse fresh responses), record (always fetch and save) or replay (offline)
+HTTP_CACHE_MODE = os.getenv("HTTP_CACHE_MODE", "off").lower()
+
+# Set how many seconds cached responses stay fresh, for recent data that can change and for older history
+HTTP_CACHE_TTL = float(os.getenv("HTTP_CACHE_TTL", 15 * 60))
+HTTP_CACHE_HISTORY_TTL = float(os.getenv("HTTP_CACHE_HISTORY_TTL", 7 * 24 * 60 * 60))
+
+# Set where run metrics are saved, and optionally a node exporter textfile collector directory for Prometheus
+METRICS_DIR = Path(os.getenv("METRICS_DIR", OUTPUTS_DIR / "metrics"))
+METRICS_TEXTFILE_DIR = os.getenv("METRICS_TEXTFILE_DIR")
+
+# Set how many times a failed request is tried, and the base and longest delay in seconds between tries
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", 4))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 1))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 60))
+
+# Set how many seconds a fetch from each source may take when both sources are fetched at once
+GARMIN_FETCH_TIMEOUT = float(os.getenv("GARMIN_FETCH_TIMEOUT", 120))
+STRAVA_FETCH_TIMEOUT = float(os.getenv("STRAVA_FETCH_TIMEOUT", 120))
+
 # Mapping the Garmin Connect activity types to Norwegian names
 ACTIVITY_TYPE_TRANSLATIONS = {
     "running": "løping",
@@ -75,6 +108,11 @@ ACTIVITY_TYPE_TRANSLATIONS = {
 }
 
 
+def configure_logging():
+    """Configure root logging at the level set in LOG_LEVEL, called once by each entry point."""
+    logging.basicConfig(level=getattr(logging, LOG_LEVEL, logging.INFO))
+
+
 def load_env(var_name, default=None):
     """Load an environment variable, log a warning if it is not set and return its value."""
     value = os.getenv(var_name, default)
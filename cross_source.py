@@ -0,0 +1,48 @@
+# Import required libraries
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Import shared configuration and functions from other scripts
+from config import logger, ACTIVITY_DAYS_RANGE, GARMIN_FETCH_TIMEOUT, STRAVA_FETCH_TIMEOUT
+from garmin_connect import fetch_data
+from strava import get_latest_activities
+
+# Seconds each source may take before the cross-source fetch gives up on it
+SOURCE_TIMEOUTS = {"garmin": GARMIN_FETCH_TIMEOUT, "strava": STRAVA_FETCH_TIMEOUT}
+
+
+def fetch_concurrently(fetchers, timeouts=None):
+    """Run independent fetch functions at the same time and return their results by source name."""
+    timeouts = {**SOURCE_TIMEOUTS, **(timeouts or {})}
+    executor = ThreadPoolExecutor(max_workers=max(len(fetchers), 1))
+    started = time.monotonic()
+    futures = {source: executor.submit(fetcher) for source, fetcher in fetchers.items()}
+
+    results = {}
+    try:
+        for source, future in futures.items():
+            timeout = timeouts.get(source)
+            remaining = None if timeout is None else max(timeout - (time.monotonic() - started), 0)
+            try:
+                results[source] = future.result(timeout=remaining)
+            except FutureTimeoutError as e:
+                raise RuntimeError(f"Fetching from {source} timed out after {timeout:.0f} seconds") from e
+            logger.info("Fetched from %s after %.1f seconds", source, time.monotonic() - started)
+    finally:
+        # Do not wait for a timed out fetch, its thread finishes in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+
+def fetch_garmin_and_strava(days=ACTIVITY_DAYS_RANGE, garmin_creds=None, timeouts=None):
+    """Fetch recent activities from Garmin Connect and Strava at the same time and return both dataframes."""
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=days)
+
+    results = fetch_concurrently({
+        "garmin": lambda: fetch_data(start_date, end_date, garmin_creds),
+        "strava": lambda: get_latest_activities(days=days, delta=True),
+    }, timeouts)
+    return results["garmin"], results["strava"]
@@ -1,20 +1,88 @@
 # NB: Currently does not include running distance from multisport activities, working to fix this
 
 # Import required libraries
+import json
+import hashlib
 import datetime
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+from pathlib import Path
 
 # Import shared configuration and functions from other scripts
-from config import logger, check_garmin_credentials, OUTPUTS_DIR
-from garmin_connect import fetch_data, prepare_dataframe
+from config import logger, configure_logging, check_garmin_credentials, OUTPUTS_DIR, RUNNING_THROUGH_GITHUB
+from utils import ensure_dir, safe_json_write
+from garmin_connect import sync_activities, prepare_dataframe
+from activity_store import load_rollups
+from metrics import span, run_metrics
 
 # Orange colour palette
 ORANGE_PALETTE = ["#FF8C42", "#FF6700", "#FF9505", "#FFA347", "#FFB366", "#FFC680", "#FFD699"]
 
-sns.set_style("whitegrid")
-plt.rcParams.update({'figure.facecolor': 'white'})
+# Bump when the dashboard layout changes, so cached renders of the same data are redrawn
+DASHBOARD_LAYOUT_VERSION = 1
+
+# Garmin Connect activity type keys counted as running
+RUNNING_TYPE_KEYS = [
+    "running", "indoor_running", "treadmill_running", "track_running",
+    "street_running", "obstacle_run", "ultra_run", "trail_running", "virtual_run"
+]
+
+# Columns of the flat lap table built from multisport activities
+LAP_COLUMNS = ['activityId', 'startTimeLocal', 'lapIndex', 'lapTypeKey', 'distance', 'duration']
+
+
+def explode_laps(df):
+    """Flatten the laps of multisport activities into one lap table, with a row per lap and its type key."""
+    if df is None or df.empty or 'laps' not in df.columns:
+        return pd.DataFrame(columns=LAP_COLUMNS)
+
+    # Normalise dataframe columns and add derived fields
+    df = prepare_dataframe(df)
+    df_multisport = df.loc[df['activityTypeKey'] == 'multisport', ['activityId', 'startTimeLocal', 'laps']]
+
+    # One row per lap, keeping the parent activity and the lap position within it
+    laps = df_multisport.explode('laps')
+    laps = laps[laps['laps'].map(lambda lap: isinstance(lap, dict))]
+    if laps.empty:
+        return pd.DataFrame(columns=LAP_COLUMNS)
+    laps['lapIndex'] = laps.groupby(level=0).cumcount()
+    laps = laps.reset_index(drop=True)
+    lap_fields = pd.json_normalize(laps['laps'].tolist())
+
+    # Lap types come either as a nested activityType dict, a flat activityTypeKey or a plain activityType string
+    lap_type = pd.Series(None, index=lap_fields.index, dtype=object)
+    for column in ('activityType.typeKey', 'activityTypeKey', 'activityType'):
+        if column in lap_fields.columns:
+            values = lap_fields[column]
+            lap_type = lap_type.fillna(values.where(values.map(lambda v: isinstance(v, str))))
+
+    return pd.DataFrame({
+        'activityId': laps['activityId'],
+        'startTimeLocal': laps['startTimeLocal'],
+        'lapIndex': laps['lapIndex'],
+        'lapTypeKey': lap_type.str.lower(),
+        'distance': pd.to_numeric(lap_fields['distance'], errors='coerce') if 'distance' in lap_fields.columns else 0.0,
+        'duration': pd.to_numeric(lap_fields['duration'], errors='coerce') if 'duration' in lap_fields.columns else 0.0,
+    }).fillna({'distance': 0, 'duration': 0})
+
+
+def extract_multisport_legs(df, lap_type, laps=None):
+    """Sum the distance of one lap type per multisport activity and assign it to the correct month."""
+    if laps is None:
+        laps = explode_laps(df)
+    laps = laps[laps['lapTypeKey'] == lap_type]
+    if laps.empty:
+        return pd.DataFrame()
+
+    legs = laps.groupby(['activityId', 'startTimeLocal'], as_index=False)['distance'].sum()
+    legs = legs[legs['distance'] > 0].drop(columns='activityId')
+    if legs.empty:
+        return pd.DataFrame()
+
+    legs['activityTypeKey'] = lap_type
+    legs['distance_km'] = legs['distance'] / 1000
+    legs['startTimeLocal'] = pd.to_datetime(legs['startTimeLocal'], errors='coerce')
+    legs['month'] = legs['startTimeLocal'].dt.to_period('M')
+    return legs.reset_index(drop=True)
 
 
 def extract_multisport_running(df):
@@ -22,42 +90,10 @@ def extract_multisport_running(df):
     if df is None or df.empty:
         return pd.DataFrame()
 
-    # Normalise dataframe columns and add derived fields
-    df = prepare_dataframe(df)
-    df_multisport = df[df['activityTypeKey'] == 'multisport'].copy()
-    running_records = []
-
-    for _, row in df_multisport.iterrows():
-        running_distance = 0
-        laps = row.get('laps', []) or []
-
-        # Sum distance of laps that are running
-        for lap in laps:
-            lap_type = None
-            if isinstance(lap.get('activityType'), dict):
-                lap_type = lap.get('activityType', {}).get('typeKey')
-            else:
-                lap_type = lap.get('activityTypeKey') or (str(lap.get('activityType') or "")).lower()
-
-            if lap_type == 'running' or (isinstance(lap_type, str) and lap_type.lower() == 'running'):
-                running_distance += lap.get('distance', 0) or 0
-
-        if running_distance > 0:
-            running_records.append({
-                'startTimeLocal': row['startTimeLocal'],
-                'distance': running_distance,
-                'activityTypeKey': 'running'
-            })
-
-    if running_records:
-        df_running_multisport = pd.DataFrame(running_records)
-        df_running_multisport['distance_km'] = df_running_multisport['distance'] / 1000
-        df_running_multisport['startTimeLocal'] = pd.to_datetime(df_running_multisport['startTimeLocal'], errors='coerce')
-        df_running_multisport['month'] = df_running_multisport['startTimeLocal'].dt.to_period('M')
+    df_running_multisport = extract_multisport_legs(df, 'running')
+    if not df_running_multisport.empty:
         logger.info("Extracted running distances from %d multisport activities", len(df_running_multisport))
-        return df_running_multisport
-    else:
-        return pd.DataFrame()
+    return df_running_multisport
 
 
 def filter_running_activities(df):
@@ -68,13 +104,8 @@ def filter_running_activities(df):
 
     df = prepare_dataframe(df)
 
-    running_keys = [
-        "running", "indoor_running", "treadmill_running", "track_running",
-        "street_running", "obstacle_run", "ultra_run", "trail_running", "virtual_run"
-    ]
-
     # Standard running activities
-    df_running = df[df['activityTypeKey'].isin(running_keys)].copy()
+    df_running = df[df['activityTypeKey'].isin(RUNNING_TYPE_KEYS)].copy()
 
     # Some rows might miss distance, ensure column exists
     df_running['distance'] = df_running.get('distance', 0).fillna(0)
@@ -104,17 +135,16 @@ def generate_weekly_running_status(goal_km=3650):
     today = datetime.date.today()
     start_of_year = datetime.date(today.year, 1, 1)
 
-    _, df_all = fetch_data(start_of_year, today, garmin_creds)
-    if df_all is None or df_all.empty:
-        logger.warning("No activities fetched for weekly report")
-        return None
-
-    df_running = filter_running_activities(df_all)
-    if df_running.empty:
+    # Read the running totals from the monthly and weekly rollups, kept up to date by the sync
+    sync_activities(start_of_year, today, garmin_creds)
+    monthly = load_rollups("garmin", "month", start_of_year, today, RUNNING_TYPE_KEYS)
+    if monthly.empty:
         logger.warning("No running activities found for weekly report")
         return None
 
-    total_km = df_running['distance_km'].sum()
+    total_km = monthly['distance'].sum() / 1000
+    start_of_week = today - datetime.timedelta(days=today.weekday())
+    week_km = load_rollups("garmin", "week", start_of_week, today, RUNNING_TYPE_KEYS)['distance'].sum() / 1000
 
     weeks_passed = max(today.isocalendar().week, 1)
     expected_km_by_now = (goal_km / 52) * weeks_passed
@@ -124,6 +154,7 @@ def generate_weekly_running_status(goal_km=3650):
         "date": today.isoformat(),
         "year": today.year,
         "total_km": round(total_km, 1),
+        "week_km": round(week_km, 1),
         "goal_km": goal_km,
         "expected_km_by_now": round(expected_km_by_now, 1),
         "delta_km": round(delta_km, 1),
@@ -138,6 +169,23 @@ def generate_weekly_running_status(goal_km=3650):
     return status
 
 
+def running_summary(start_date, end_date):
+    """Return total km, monthly and cumulative km and run type counts from the monthly rollups, or None without runs."""
+    monthly = load_rollups("garmin", "month", start_date, end_date, RUNNING_TYPE_KEYS)
+    if monthly.empty:
+        return None
+
+    # Total kilometer count
+    total_km = monthly['distance'].sum() / 1000
+
+    # Monthly kilometer summary
+    monthly_distances = (monthly.groupby(monthly['period_start'].dt.to_period('M'))['distance'].sum() / 1000).sort_index()
+    cumulative_distances = monthly_distances.cumsum()
+    type_counts = monthly.groupby('activity_type')['activity_count'].sum().sort_values(ascending=False)
+    type_counts = type_counts[type_counts > 0]
+    return total_km, monthly_distances, cumulative_distances, type_counts
+
+
 def generate_dashboard(show_plot=True):
     """Fetch activities from Garmin Connect and generate running dashboard."""
     logger.info("Starting dashboard generation")
@@ -147,30 +195,73 @@ def generate_dashboard(show_plot=True):
     start_of_year = datetime.date(today.year, 1, 1)
     logger.info("Fetching activities from %s to %s", start_of_year, today)
 
-    _, df_all = fetch_data(start_of_year, today, garmin_creds)
-    if df_all is None or df_all.empty:
-        logger.warning("No activities fetched from Garmin Connect")
-        return
-    logger.info("Fetched %d total activities", len(df_all))
+    # Sync new activities, then read one row per month and running type from the rollups
+    fetched = sync_activities(start_of_year, today, garmin_creds)
+    logger.info("Synced %d activities from Garmin Connect", fetched)
 
-    df_running = filter_running_activities(df_all)
-    if df_running is None or df_running.empty:
+    summary = running_summary(start_of_year, today)
+    if summary is None:
         logger.warning("No running activities found for this year")
         return
-
-    # Total kilometer count
-    total_km = df_running['distance_km'].sum()
+    total_km, monthly_distances, cumulative_distances, type_counts = summary
     logger.info("Total running distance this year: %.2f km", total_km)
 
-    # Monthly kilometer summary
-    monthly_distances = df_running.groupby('month')['distance_km'].sum().sort_index()
-    if monthly_distances.empty:
-        logger.warning("No monthly distance data to plot")
-        return
+    # Skip rendering when the aggregated inputs are unchanged since the last saved dashboard
+    dashboard_path = OUTPUTS_DIR / "run_distance.png"
+    fingerprint_path = dashboard_path.with_suffix(".json")
+    fingerprint = dashboard_fingerprint(today.year, total_km, monthly_distances, type_counts)
+    if dashboard_path.exists() and read_fingerprint(fingerprint_path) == fingerprint:
+        logger.info("Running data unchanged since last render, reusing %s", dashboard_path)
+        if show_plot:
+            show_image(dashboard_path)
+        return str(dashboard_path)
+
+    render_dashboard(str(dashboard_path), today.year, total_km, monthly_distances, cumulative_distances, type_counts, show_plot)
+    safe_json_write(fingerprint_path, {"fingerprint": fingerprint}, logger)
+    return str(dashboard_path)
+
+
+def dashboard_fingerprint(year, total_km, monthly_distances, type_counts):
+    """Return a hash of the aggregated dashboard inputs, which changes only when the rendered figure would."""
+    payload = {
+        "layout": DASHBOARD_LAYOUT_VERSION,
+        "year": year,
+        "total_km": round(float(total_km), 3),
+        "monthly_km": {str(month): round(float(km), 3) for month, km in monthly_distances.items()},
+        "type_counts": {str(key): int(count) for key, count in type_counts.items()},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def read_fingerprint(path):
+    """Return the fingerprint saved with the last dashboard render, or None if there is none."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("fingerprint")
+    except (OSError, ValueError):
+        return None
+
+
+def load_pyplot():
+    """Import and style matplotlib on first use, as it is slow to load and only needed when drawing."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.set_style("whitegrid")
+    plt.rcParams.update({'figure.facecolor': 'white'})
+    return plt
+
+
+def show_image(path):
+    """Open a previously saved dashboard image in the default viewer, without loading matplotlib."""
+    import webbrowser
+
+    webbrowser.open(Path(path).resolve().as_uri())
 
-    cumulative_distances = monthly_distances.cumsum()
-    type_counts = df_running['activityTypeKey'].value_counts()
 
+def render_dashboard(dashboard_path, year, total_km, monthly_distances, cumulative_distances, type_counts, show_plot=True):
+    """Draw the running dashboard figure from aggregated distances and save it to the given path."""
+    plt = load_pyplot()
     fig = plt.figure(constrained_layout=True, figsize=(14, 10))
     gs = fig.add_gridspec(3, 2)
 
@@ -182,7 +273,7 @@ def generate_dashboard(show_plot=True):
     ax_total.set_xticks([0])
     ax_total.set_xticklabels(["Total km run"])
     ax_total.set_ylabel("Distance (km)")
-    ax_total.set_title(f"Total running distance in {today.year}", fontsize=14)
+    ax_total.set_title(f"Total running distance in {year}", fontsize=14)
     for x, y in zip(x_total, y_total):
         ax_total.text(x, y, f"{y:.1f} km", ha='center', va='bottom', fontsize=12, fontweight='bold')
 
@@ -229,8 +320,10 @@ def generate_dashboard(show_plot=True):
     ax_pie.legend([k.replace("_", " ").title() for k in type_counts.index], bbox_to_anchor=(1, 0.5))
 
     # Save and show the plot
-    dashboard_path = str(OUTPUTS_DIR / "run_distance.png")
-    fig.savefig(dashboard_path, dpi=150, bbox_inches='tight')
+    # Matplotlib draws the figure when saving it, so this is where rendering time goes
+    ensure_dir(OUTPUTS_DIR)
+    with span("plot", chart="dashboard"):
+        fig.savefig(dashboard_path, dpi=150, bbox_inches='tight')
     if show_plot:
         plt.show()
     plt.close(fig)
@@ -238,4 +331,6 @@ def generate_dashboard(show_plot=True):
 
 
 if __name__ == "__main__":
-        generate_dashboard()
+    configure_logging()
+    with run_metrics("dashboard"):
+        generate_dashboard(show_plot=not RUNNING_THROUGH_GITHUB)
@@ -1,22 +1,34 @@
 # Import required libraries
+import os
+import re
+import time
 import datetime
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
 from garminconnect import Garmin, GarminConnectAuthenticationError, GarminConnectConnectionError, GarminConnectTooManyRequestsError
 
 # Import shared configuration and functions from other scripts
-from config import logger, check_garmin_credentials, ACTIVITY_DAYS_RANGE, ACTIVITY_TYPE_TRANSLATIONS, RUNNING_THROUGH_GITHUB, LOGO_PATH, GARMIN_TOKENSTORE
-from todoist_integration import create_todoist_task
-from task_tracker import init_db, task_exists, mark_task_created
-from utils import ensure_dir
+from config import logger, configure_logging, check_garmin_credentials, ACTIVITY_DAYS_RANGE, ACTIVITY_TYPE_TRANSLATIONS, RUNNING_THROUGH_GITHUB, LOGO_PATH, GARMIN_TOKENSTORE, SYNC_OVERLAP_DAYS
+from task_tracker import init_db, existing_tasks, mark_task_created, is_file_uploaded, mark_file_uploaded
+from activity_store import get_sync_state, set_sync_state, replace_activities, ranges_to_fetch
+from activity_schema import GARMIN_SCHEMA, project_records
+from rate_limit import acquire, is_rate_limited, record_rate_limited, record_success, RateLimitDeferred
+from retry import with_retries, is_transient, status_code
+from http_cache import cached_response, history_ttl
+from utils import file_sha256
+from metrics import span, increment, run_metrics
 
 # Define global variable for API
 API = None
 
-# Ensure project graphics directory exist
-PLOTS_DIR = "graphics"
-ensure_dir(PLOTS_DIR)
+# Number of activities requested per page of the Garmin Connect activity search
+GARMIN_PAGE_SIZE = 100
+
+
+# Categorical dtype of every Norwegian activity name, so translated columns store small integer codes
+ACTIVITY_NAME_DTYPE = pd.CategoricalDtype(sorted(set(ACTIVITY_TYPE_TRANSLATIONS.values())))
+
+# Columns added by prepare_dataframe, used to recognise frames that are already prepared
+PREPARED_COLUMNS = ('activityTypeKey', 'activityTypeNameNo', 'duration_hr')
 
 
 def translate_activity_type(type_key):
@@ -35,6 +47,48 @@ def prompt_garmin_mfa():
     return input("Garmin MFA code: ").strip()
 
 
+def garmin_status_code(error):
+    """Return the HTTP status code of a Garmin Connect error, as the library only gives it in an "API Error NNN" message."""
+    code = status_code(error)
+    if code is None:
+        match = re.match(r"API Error (\d{3})\b", str(error))
+        code = int(match.group(1)) if match else None
+    return code
+
+
+def is_garmin_rate_limited(error):
+    """Return whether a Garmin Connect error was caused by a 429 rate limit response."""
+    return isinstance(error, GarminConnectTooManyRequestsError) or is_rate_limited(error)
+
+
+def is_transient_garmin_error(error):
+    """Return whether a Garmin Connect error is worth retrying, a dropped connection or a server error but not a 429."""
+    if is_garmin_rate_limited(error):
+        return False
+    if isinstance(error, GarminConnectConnectionError):
+        code = garmin_status_code(error)
+        return code is None or code >= 500
+    return is_transient(error)
+
+
+def garmin_request(call, *args, **kwargs):
+    """Call the Garmin Connect API within the request budget shared by every job, pausing all of them after a 429."""
+    while True:
+        acquire("garmin")
+        try:
+            with span("garmin_request", call=getattr(call, "__name__", "request")):
+                result = with_retries(call, *args, retryable=is_transient_garmin_error,
+                                      description=f"Garmin Connect {getattr(call, '__name__', 'request')}", **kwargs)
+        except Exception as e:
+            if not is_garmin_rate_limited(e):
+                raise
+            # Back off and wait for the budget again, until the back-off grows past the longest wait
+            record_rate_limited("garmin")
+            continue
+        record_success("garmin")
+        return result
+
+
 def get_api(creds=None):
     """Return a cached Garmin Connect API instance, to only login once per run."""
     global API
@@ -51,7 +105,7 @@ def get_api(creds=None):
         prompt_mfa=prompt_garmin_mfa,
     )
 
-    api.login(GARMIN_TOKENSTORE)
+    garmin_request(api.login, GARMIN_TOKENSTORE)
     logger.info(
         "Authenticated as %s using Garmin token store %s",
         creds["GARMIN_USER"],
@@ -61,28 +115,108 @@ def get_api(creds=None):
     return api
 
 
-def fetch_data(start_date, end_date, creds=None):
-    """Fetch activities from Garmin Connect for a given date range."""
+def iter_activity_pages(start_date, end_date, creds, page_size=GARMIN_PAGE_SIZE):
+    """Yield raw Garmin Connect activities for a date range one page at a time, newest first.
+    Each page is a request of its own, taken from the shared budget, retried and cached on its own."""
+    def search(params):
+        api = get_api(creds)
+        return garmin_request(api.connectapi, api.garmin_connect_activities, params=params)
+
+    # Page through the activity search with start and limit, so a failed page does not refetch the pages before it
+    start = 0
+    while True:
+        params = {
+            "startDate": start_date.isoformat(),
+            "endDate": end_date.isoformat(),
+            "start": str(start),
+            "limit": str(page_size),
+        }
+        # Log in only when the page is not served from the HTTP cache, so replay mode needs no network
+        activities = cached_response(
+            "garmin", {"call": "search_activities", **params},
+            lambda: search(params),
+            ttl=history_ttl(end_date),
+        ) or []
+        if not activities:
+            return
+
+        yield activities
+
+        if len(activities) < page_size:
+            return
+        start += page_size
+
+
+def fetch_data(start_date, end_date, creds=None, compact=True, keep_raw=False):
+    """Fetch activities from Garmin Connect for a given date range, projected onto the compact schema by default."""
+    try:
+        if creds is None:
+            creds = check_garmin_credentials()
+
+        activities = [activity for page in iter_activity_pages(start_date, end_date, creds) for activity in page]
+        increment("activities_fetched", len(activities), source="garmin")
+        if compact:
+            df = project_records(activities, GARMIN_SCHEMA, keep_raw=keep_raw)
+        else:
+            df = pd.DataFrame(activities)
+        return df
+
+    except (GarminConnectAuthenticationError, GarminConnectConnectionError, GarminConnectTooManyRequestsError) as e:
+        if is_garmin_rate_limited(e):
+            # Pause every job like garmin_request does, and defer the caller until the back-off ends
+            raise RateLimitDeferred("garmin", time.time() + record_rate_limited("garmin")) from e
+        raise RuntimeError("Error related to Garmin Connect connection or authentication occurred") from e
+    except RateLimitDeferred:
+        raise
+    except Exception as e:
+        logger.error("Unexpected error fetching Garmin data: %s", e, exc_info=True)
+        raise RuntimeError(f"Unexpected error fetching Garmin data: {e}") from e
+
+
+def iter_activity_chunks(start_date, end_date, creds=None, chunk_size=GARMIN_PAGE_SIZE, compact=True):
+    """Yield Garmin Connect activities for a date range as dataframes of at most chunk_size rows, newest first."""
     try:
         if creds is None:
             creds = check_garmin_credentials()
-        api = get_api(creds)
 
-        activities = api.get_activities_by_date(start_date.isoformat(), end_date.isoformat())
-        df = pd.DataFrame(activities)
-        return api, df
+        for activities in iter_activity_pages(start_date, end_date, creds, chunk_size):
+            yield project_records(activities, GARMIN_SCHEMA) if compact else pd.DataFrame(activities)
 
     except (GarminConnectAuthenticationError, GarminConnectConnectionError, GarminConnectTooManyRequestsError) as e:
-        if "429" in str(e):
-            raise RuntimeError("Garmin Connect API rate limit exceeded, 429 error") from e
+        if is_garmin_rate_limited(e):
+            # Pause every job like garmin_request does, and defer the caller until the back-off ends
+            raise RateLimitDeferred("garmin", time.time() + record_rate_limited("garmin")) from e
         raise RuntimeError("Error related to Garmin Connect connection or authentication occurred") from e
+    except RateLimitDeferred:
+        raise
     except Exception as e:
         logger.error("Unexpected error fetching Garmin data: %s", e, exc_info=True)
         raise RuntimeError(f"Unexpected error fetching Garmin data: {e}") from e
-    
+
+
+def sync_activities(start_date, end_date, creds=None, overlap_days=SYNC_OVERLAP_DAYS):
+    """Fetch only the Garmin Connect activities missing from the local store and save them."""
+    init_db()
+
+    fetched = 0
+    for range_start, range_end in ranges_to_fetch("garmin", start_date, end_date, overlap_days):
+        logger.info("Syncing Garmin Connect activities from %s to %s", range_start, range_end)
+        df = fetch_data(range_start, range_end, creds, compact=False)
+        records = df.to_dict("records") if df is not None and not df.empty else []
+        fetched += replace_activities("garmin", records, range_start, range_end, "activityId", "startTimeLocal")
+
+    # Only move the high-water mark once every range has been stored
+    synced_from, high_water_mark = get_sync_state("garmin")
+    synced_from = min(synced_from, start_date) if synced_from else start_date
+    high_water_mark = max(high_water_mark, end_date) if high_water_mark else end_date
+    set_sync_state("garmin", synced_from, high_water_mark)
+    return fetched
+
 
 def insert_logo(fig):
     """Insert application logo into the given figure if available."""
+    import matplotlib.image as mpimg
+
     try:
         logo_img = mpimg.imread(LOGO_PATH)
         logo_ax = fig.add_axes([0.80, 0.80, 0.18, 0.18], anchor='NE', zorder=1)
@@ -94,45 +228,85 @@ def insert_logo(fig):
         logger.warning("Failed to insert logo: %s", e)
 
 
+def is_prepared(df):
+    """Return whether a dataframe has already been normalised by prepare_dataframe."""
+    return (
+        all(column in df.columns for column in PREPARED_COLUMNS)
+        and isinstance(df['activityTypeNameNo'].dtype, pd.CategoricalDtype)
+        and pd.api.types.is_datetime64_any_dtype(df['startTimeLocal'])
+    )
+
+
+def activity_type_keys(activity_types):
+    """Flatten the nested activityType column to a categorical series of type keys in one pass."""
+    keys = [
+        (value.get('typeKey') or 'unknown') if isinstance(value, dict) else (value if isinstance(value, str) and value else 'unknown')
+        for value in activity_types.to_numpy()
+    ]
+    return pd.Series(keys, index=activity_types.index, dtype="category")
+
+
+def translate_activity_types(type_keys):
+    """Translate a categorical series of type keys to Norwegian names, looking up each category only once."""
+    translated = [translate_activity_type(key) for key in type_keys.cat.categories]
+    name_codes = ACTIVITY_NAME_DTYPE.categories.get_indexer(translated)
+    codes = name_codes[type_keys.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=ACTIVITY_NAME_DTYPE), index=type_keys.index)
+
+
 def prepare_dataframe(df):
     """Normalise dataframe columns and add derived fields used for plotting and tasks."""
     if df is None or df.empty:
         return pd.DataFrame() if df is None else df
 
-    # Work on a copy but keep existing columns
-    df = df.copy()
+    # Frames that are already prepared are returned as they are, so repeated calls are cheap
+    if is_prepared(df):
+        return df
+
+    # Work on a shallow copy, new and replaced columns do not touch the caller's frame
+    df = df.copy(deep=False)
 
     # Ensure that the required columns exist, but do not remove others
-    required_columns = ['activityId', 'activityType', 'startTimeLocal', 'duration', 'averageHR']
+    required_columns = ['activityId', 'startTimeLocal', 'duration', 'averageHR']
     for column in required_columns:
         if column not in df.columns:
             df[column] = None
 
-    df['activityTypeKey'] = df['activityType'].apply(lambda x: (x or {}).get('typeKey', 'unknown') if isinstance(x, dict) else (str(x) or 'annet'))
-    df['activityTypeNameNo'] = df['activityTypeKey'].apply(translate_activity_type)
+    # Compact frames already carry the flat type key, raw frames carry the nested activityType dict
+    if 'activityType' in df.columns or 'activityTypeKey' not in df.columns:
+        df['activityTypeKey'] = activity_type_keys(df.get('activityType', pd.Series(None, index=df.index, dtype=object)))
+    else:
+        df['activityTypeKey'] = activity_type_keys(df['activityTypeKey'].astype(object))
+    df['activityTypeNameNo'] = translate_activity_types(df['activityTypeKey'])
     df['startTimeLocal'] = pd.to_datetime(df['startTimeLocal'], errors="coerce", utc=True).dt.tz_convert(None)
-    df['duration_hr'] = df['duration'].fillna(0) / 3600
+    df['duration_hr'] = pd.to_numeric(df['duration'], errors="coerce").fillna(0) / 3600
     return df
 
 
 def plot_pie(counts):
     """Create pie chart for activity distribution."""
-    figure_1 = plt.figure(figsize=(6, 6), constrained_layout=True)
-    plt.pie(counts.values, labels=counts.index.str.capitalize(), autopct='%1.1f%%')
-    plt.title("Aktivitetsfordeling")
-    insert_logo(figure_1)
+    import matplotlib.pyplot as plt
+
+    with span("plot", chart="pie"):
+        figure_1 = plt.figure(figsize=(6, 6), constrained_layout=True)
+        plt.pie(counts.values, labels=counts.index.str.capitalize(), autopct='%1.1f%%')
+        plt.title("Aktivitetsfordeling")
+        insert_logo(figure_1)
     plt.show()
 
 
 def plot_line(df):
     """Create line plot for activity duration over time."""
-    figure_2 = plt.figure(figsize=(10, 5), constrained_layout=True)
-    plt.plot(df['startTimeLocal'], df['duration_hr'], marker='o')
-    plt.xlabel("Dato")
-    plt.ylabel("Varighet i timer")
-    plt.title("Varighet for aktivitet over tid")
-    plt.xticks(rotation=45)
-    insert_logo(figure_2)
+    import matplotlib.pyplot as plt
+
+    with span("plot", chart="line"):
+        figure_2 = plt.figure(figsize=(10, 5), constrained_layout=True)
+        plt.plot(df['startTimeLocal'], df['duration_hr'], marker='o')
+        plt.xlabel("Dato")
+        plt.ylabel("Varighet i timer")
+        plt.title("Varighet for aktivitet over tid")
+        plt.xticks(rotation=45)
+        insert_logo(figure_2)
     plt.show()
 
 
@@ -144,7 +318,9 @@ def process_and_plot(df):
 
     df = prepare_dataframe(df)
 
+    # Categorical columns count every known category, so keep only the types that occur
     counts = df['activityTypeNameNo'].value_counts()
+    counts = counts[counts > 0]
 
     # Print the personal training summaries
     print("Aktiviteter i perioden:")
@@ -169,31 +345,68 @@ def process_and_plot(df):
           }).to_string(index=False))
 
 
+def is_duplicate_upload(error):
+    """Return whether a Garmin Connect upload error means the activity already exists."""
+    message = str(error).lower()
+    return "duplicate" in message or ("409" in message and "conflict" in message)
+
+
+def record_duplicate_upload(file_path, file_hash):
+    """Record an activity file Garmin Connect already has as uploaded, since the upload goal is met."""
+    logger.info("Activity file %s already exists in Garmin Connect", file_path)
+    if file_hash:
+        mark_file_uploaded(file_hash, file_path)
+    return True
+
+
 def upload_activity_file_to_garmin(file_path, creds=None):
-    """Upload an activity FIT file to Garmin Connect."""
+    """Upload an activity FIT file to Garmin Connect, skipping files with identical content uploaded before."""
     if creds is None:
         creds = check_garmin_credentials()
+
+    # Check the content hash before any network call, so re-exported or copied files are not uploaded twice
+    try:
+        file_hash = file_sha256(file_path)
+        file_size = os.path.getsize(file_path)
+        init_db()
+    except OSError as e:
+        logger.warning("Could not hash activity file %s, uploading without duplicate check: %s", file_path, e)
+        file_hash, file_size = None, 0
+    if file_hash and is_file_uploaded(file_hash):
+        logger.info("Skipping activity file %s, identical content already uploaded", file_path)
+        return True
+
     try:
         api = get_api(creds)
-        success = api.upload_activity(file_path)
+        success = garmin_request(api.upload_activity, file_path)
         if success:
             logger.info("Successfully uploaded activity file: %s", file_path)
+            increment("garmin_upload_bytes", file_size)
+            if file_hash:
+                mark_file_uploaded(file_hash, file_path)
         else:
             logger.error("Failed to upload activity file: %s", file_path)
         return success
     except (GarminConnectAuthenticationError, GarminConnectConnectionError, GarminConnectTooManyRequestsError) as e:
+        if is_duplicate_upload(e):
+            return record_duplicate_upload(file_path, file_hash)
         logger.error("Failed to upload activity to Garmin Connect: %s", e, exc_info=True)
         return False
     except AssertionError:
         logger.error("Token or cache error for Garmin", exc_info=True)
         return False
     except Exception as e:
+        if is_duplicate_upload(e):
+            return record_duplicate_upload(file_path, file_hash)
         logger.error("Unexpected error during upload: %s", e, exc_info=True)
         return False
 
 
 def main():
     """Main entry point for fetching, processing and creating tasks."""
+    # Todoist is only needed once there are tasks to create, so load it here
+    from todoist_integration import create_todoist_task
+
     # Get credentials and run credentials check
     garmin_creds = check_garmin_credentials()
 
@@ -203,26 +416,29 @@ def main():
 
     # Fetch and process all activities for plotting, skip if running through GitHub
     if not RUNNING_THROUGH_GITHUB:
-        _, df_all = fetch_data(start_time, end_time, garmin_creds)
+        df_all = fetch_data(start_time, end_time, garmin_creds)
         process_and_plot(df_all)
 
     # Initialise tracking database
     init_db()
 
     # Fetch today's activities for task creation
-    _, df_today = fetch_data(today, today, garmin_creds)
+    df_today = fetch_data(today, today, garmin_creds)
     if df_today is None or df_today.empty:
         logger.info("No activities from Garmin found for today")
         return
 
     df_today = prepare_dataframe(df_today)
 
+    # Look up which activities already have tasks with one query for the whole batch
+    created = existing_tasks(df_today['activityId'].astype(str))
+
     for _, row in df_today.iterrows():
         activity_id = str(row['activityId'])
         activity_type_key = row['activityTypeKey']
         activity_type_no = row['activityTypeNameNo']
 
-        if task_exists(activity_id):
+        if activity_id in created:
             logger.info("Task already created for activity %s (%s), skipping.", activity_type_key, activity_id)
             continue
 
@@ -233,4 +449,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    configure_logging()
+    with run_metrics("garmin_connect"):
+        main()
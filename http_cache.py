@@ -0,0 +1,89 @@
+# Import required libraries
+import re
+import json
+import time
+import hashlib
+import datetime
+
+# Import shared configuration and functions from other scripts
+from config import logger, CACHE_DIR, HTTP_CACHE_MODE, HTTP_CACHE_TTL, HTTP_CACHE_HISTORY_TTL, SYNC_OVERLAP_DAYS
+from utils import safe_json_write
+from metrics import increment
+
+# Cache modes, where replay serves recorded responses only and never calls the APIs
+CACHE_MODES = ("off", "cache", "record", "replay")
+
+# Strava endpoints whose responses never change once recorded, as finished activity streams are fixed
+IMMUTABLE_STRAVA_PATHS = re.compile(r"^/activities/\d+/streams$")
+
+
+class CacheMiss(RuntimeError):
+    """Raised in replay mode when no response has been recorded for a request."""
+
+
+def replaying():
+    """Return whether responses are served from recordings only, so no tokens or logins are needed."""
+    return HTTP_CACHE_MODE == "replay"
+
+
+def cache_key(source, request):
+    """Return a stable hash of a request, with parameters in sorted order so equal requests share an entry."""
+    payload = json.dumps({"source": source, "request": request}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def entry_path(source, request):
+    """Return the cache file holding the recorded response of a request."""
+    return CACHE_DIR / "http" / source / f"{cache_key(source, request)}.json"
+
+
+def history_ttl(end_date, today=None):
+    """Return the TTL for data up to a date, volatile while it is within the sync overlap window and stable after."""
+    today = today or datetime.date.today()
+    if end_date is None or end_date >= today - datetime.timedelta(days=SYNC_OVERLAP_DAYS):
+        return HTTP_CACHE_TTL
+    return HTTP_CACHE_HISTORY_TTL
+
+
+def strava_ttl(path, params=None):
+    """Return the TTL for a Strava API request, None for immutable data such as activity streams."""
+    if IMMUTABLE_STRAVA_PATHS.match(path):
+        return None
+    before = (params or {}).get("before")
+    if before is None:
+        return HTTP_CACHE_TTL
+    return history_ttl(datetime.datetime.fromtimestamp(int(before), datetime.timezone.utc).date())
+
+
+def read_entry(path):
+    """Return a recorded cache entry, or None if there is none or it cannot be read."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def cached_response(source, request, fetch, ttl=HTTP_CACHE_TTL, mode=None, now=None):
+    """Return a response from the disk cache when allowed by the cache mode and TTL, otherwise fetch and record it."""
+    mode = mode or HTTP_CACHE_MODE
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown HTTP_CACHE_MODE: {mode}, expected one of {', '.join(CACHE_MODES)}")
+    if mode == "off":
+        return fetch()
+
+    path = entry_path(source, request)
+    now = time.time() if now is None else now
+    if mode in ("cache", "replay"):
+        entry = read_entry(path)
+        if entry is not None and (mode == "replay" or ttl is None or now - entry["stored_at"] < ttl):
+            logger.debug("Serving %s response from cache: %s", source, request)
+            increment("http_cache_hits", source=source)
+            return entry["body"]
+        if mode == "replay":
+            raise CacheMiss(f"No recorded {source} response for {request}, record it first with HTTP_CACHE_MODE=record")
+
+    increment("http_cache_misses", source=source)
+    body = fetch()
+    safe_json_write(path, {"stored_at": now, "request": request, "body": body}, logger, indent=None)
+    return body
@@ -0,0 +1,167 @@
+# Import required libraries
+import os
+import json
+import time
+import bisect
+import datetime
+import threading
+from contextlib import contextmanager
+
+# Import shared configuration and functions from other scripts
+from config import logger, METRICS_DIR, METRICS_TEXTFILE_DIR
+from utils import ensure_dir
+
+# Upper bounds in seconds of the latency histogram buckets, as used by Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Prefix of every metric name in the Prometheus textfile output
+METRIC_PREFIX = "garmin_strava"
+
+
+class Metrics:
+    """Collect span latencies and counters for one run, safe to update from several threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far, at the start of a run."""
+        with self.lock:
+            self.spans = {}
+            self.counters = {}
+            self.started = time.time()
+
+    def observe(self, name, seconds, **labels):
+        """Record the duration of one span in its latency histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            span = self.spans.get(key)
+            if span is None:
+                span = self.spans[key] = {"count": 0, "sum": 0.0, "min": seconds, "max": seconds, "buckets": [0] * len(LATENCY_BUCKETS)}
+            span["count"] += 1
+            span["sum"] += seconds
+            span["min"] = min(span["min"], seconds)
+            span["max"] = max(span["max"], seconds)
+            index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+            if index < len(LATENCY_BUCKETS):
+                span["buckets"][index] += 1
+
+    def increment(self, name, value=1, **labels):
+        """Add to a counter, such as a number of records or bytes."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self, run_name):
+        """Return everything recorded in this run as a JSON serialisable dict."""
+        with self.lock:
+            return {
+                "run": run_name,
+                "started_at": datetime.datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "duration_seconds": round(time.time() - self.started, 3),
+                "spans": [
+                    {"name": name, "labels": dict(labels), "count": s["count"], "total_seconds": round(s["sum"], 6),
+                     "mean_seconds": round(s["sum"] / s["count"], 6), "min_seconds": round(s["min"], 6),
+                     "max_seconds": round(s["max"], 6), "buckets": dict(zip(map(str, LATENCY_BUCKETS), s["buckets"]))}
+                    for (name, labels), s in sorted(self.spans.items(), key=lambda item: -item[1]["sum"])
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+            }
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def span(name, **labels):
+    """Time a block of work as a named span, counting it as an error if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        METRICS.increment(f"{name}_errors", **labels)
+        raise
+    finally:
+        METRICS.observe(name, time.perf_counter() - started, **labels)
+
+
+def increment(name, value=1, **labels):
+    """Add to a counter of the current run."""
+    METRICS.increment(name, value, **labels)
+
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    """Return (name, value) label pairs in the Prometheus text format."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def prometheus_text(summary):
+    """Return a run summary in the Prometheus text exposition format, for the node exporter textfile collector."""
+    lines = [f"# TYPE {METRIC_PREFIX}_span_seconds histogram"]
+    for s in summary["spans"]:
+        labels = (("span", s["name"]),) + tuple(sorted(s["labels"].items()))
+        cumulative = 0
+        for bound, count in s["buckets"].items():
+            cumulative += count
+            lines.append(f"{METRIC_PREFIX}_span_seconds_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+        lines.append(f"{METRIC_PREFIX}_span_seconds_bucket{_label_text(labels + (('le', '+Inf'),))} {s['count']}")
+        lines.append(f"{METRIC_PREFIX}_span_seconds_sum{_label_text(labels)} {s['total_seconds']}")
+        lines.append(f"{METRIC_PREFIX}_span_seconds_count{_label_text(labels)} {s['count']}")
+
+    for name in sorted({c["name"] for c in summary["counters"]}):
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+        for c in summary["counters"]:
+            if c["name"] == name:
+                lines.append(f"{METRIC_PREFIX}_{name}_total{_label_text(tuple(sorted(c['labels'].items())))} {c['value']}")
+
+    run = (("run", summary["run"]),)
+    lines.append(f"# TYPE {METRIC_PREFIX}_run_duration_seconds gauge")
+    lines.append(f"{METRIC_PREFIX}_run_duration_seconds{_label_text(run)} {summary['duration_seconds']}")
+    lines.append(f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge")
+    lines.append(f"{METRIC_PREFIX}_last_run_timestamp_seconds{_label_text(run)} {int(time.time())}")
+    return "\n".join(lines) + "\n"
+
+
+def write_run_metrics(run_name):
+    """Append the run summary to the JSON Lines history of the run, and write the Prometheus textfile if configured."""
+    summary = METRICS.summary(run_name)
+
+    history_path = ensure_dir(METRICS_DIR) / f"{run_name}.jsonl"
+    with open(history_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(summary) + "\n")
+
+    if METRICS_TEXTFILE_DIR:
+        # Write to a temporary file first, so the collector never reads a half-written file
+        textfile_path = ensure_dir(METRICS_TEXTFILE_DIR) / f"{run_name}.prom"
+        tmp_path = textfile_path.with_name(textfile_path.name + f".{os.getpid()}.tmp")
+        tmp_path.write_text(prometheus_text(summary), encoding="utf-8")
+        tmp_path.replace(textfile_path)
+
+    slowest = ", ".join(f"{s['name']} {s['total_seconds']:.2f}s/{s['count']}" for s in summary["spans"][:5])
+    logger.info("Run %s took %.1f seconds, slowest spans: %s", run_name, summary["duration_seconds"], slowest or "none")
+    return summary
+
+
+@contextmanager
+def run_metrics(run_name):
+    """Collect metrics for a whole scheduled run and save them when it ends, also when it fails."""
+    METRICS.reset()
+    try:
+        with span("run"):
+            yield METRICS
+    finally:
+        try:
+            write_run_metrics(run_name)
+        except OSError as e:
+            logger.warning("Could not write metrics for run %s: %s", run_name, e)
@@ -0,0 +1,184 @@
+# Import required libraries
+import re
+import time
+
+# Import shared configuration and functions from other scripts
+import task_tracker
+from config import (
+    logger, STRAVA_RATE_LIMIT_15MIN, STRAVA_RATE_LIMIT_DAILY, GARMIN_RATE_LIMIT_15MIN, RATE_LIMIT_MAX_WAIT
+)
+from task_tracker import init_db, get_connection
+from retry import status_code
+from metrics import increment
+
+# Request budgets per source, as (window name, default capacity, window length in seconds)
+# Windows are aligned to the clock, so the daily window resets at midnight UTC like Strava's
+RATE_LIMITS = {
+    "strava": [("15min", STRAVA_RATE_LIMIT_15MIN, 15 * 60), ("daily", STRAVA_RATE_LIMIT_DAILY, 24 * 60 * 60)],
+    "garmin": [("15min", GARMIN_RATE_LIMIT_15MIN, 15 * 60)],
+}
+
+# Share of each window used, leaving room for other apps using the same account
+RATE_LIMIT_HEADROOM = 0.9
+
+# First and longest wait after a 429 response, doubled on each further 429
+BACKOFF_INITIAL_SECONDS = 60
+BACKOFF_MAX_SECONDS = 60 * 60
+
+# Database paths whose rate limit tables have been created in this process
+_initialised = set()
+
+
+class RateLimitDeferred(RuntimeError):
+    """Raised when the shared request budget would make a caller wait longer than it allows."""
+
+    def __init__(self, source, retry_at):
+        self.source = source
+        self.retry_at = retry_at
+        super().__init__(f"{source} rate limit budget exhausted, retry after {time.strftime('%H:%M:%S', time.localtime(retry_at))}")
+
+
+def is_rate_limited(error):
+    """Return whether an error from Garmin Connect or Strava was caused by a 429 rate limit response, or deferred by the budget."""
+    if status_code(error) == 429:
+        return True
+    # Follow the errors it was raised from, as Garmin Connect reports a 429 only as an "API Error 429" message
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, RateLimitDeferred) or re.match(r"API Error 429\b", str(error)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _ensure_tables():
+    """Create the tracker tables on first use in this process, as any entry point may hit an API first."""
+    if task_tracker.DB_PATH not in _initialised:
+        init_db()
+        _initialised.add(task_tracker.DB_PATH)
+
+
+def _window_start(now, length):
+    """Return the start of the clock-aligned window of the given length containing a timestamp."""
+    return now - (now % length)
+
+
+def reserve(source, cost=1, now=None, headroom=RATE_LIMIT_HEADROOM):
+    """Take requests from the shared budget of a source, or return the seconds to wait if it is used up."""
+    _ensure_tables()
+    now = time.time() if now is None else now
+
+    with get_connection() as conn:
+        # Lock the database for writing, so processes sharing the budget cannot both take the last request
+        conn.execute("BEGIN IMMEDIATE")
+
+        row = conn.execute("SELECT blocked_until FROM rate_limit_backoff WHERE source = ?", (source,)).fetchone()
+        if row and row[0] > now:
+            conn.commit()
+            return row[0] - now
+
+        updates, wait = [], 0.0
+        for window_name, default_capacity, length in RATE_LIMITS[source]:
+            window_start = _window_start(now, length)
+            row = conn.execute(
+                "SELECT window_start, used, capacity FROM rate_limits WHERE source = ? AND window_name = ?",
+                (source, window_name),
+            ).fetchone()
+            capacity = row[2] if row else default_capacity
+            used = row[1] if row and row[0] == window_start else 0
+
+            if used + cost > int(capacity * headroom):
+                wait = max(wait, window_start + length - now)
+            updates.append((source, window_name, window_start, used + cost, capacity))
+
+        if wait == 0:
+            conn.executemany(
+                """
+                INSERT INTO rate_limits (source, window_name, window_start, used, capacity)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(source, window_name) DO UPDATE SET
+                    window_start = excluded.window_start,
+                    used = excluded.used,
+                    capacity = excluded.capacity
+                """,
+                updates,
+            )
+        conn.commit()
+
+    return wait
+
+
+def acquire(source, cost=1, max_wait=RATE_LIMIT_MAX_WAIT):
+    """Wait until the shared budget of a source allows a request, deferring the caller if the wait is too long."""
+    waited = 0.0
+    while True:
+        wait = reserve(source, cost)
+        if wait <= 0:
+            return waited
+        if max_wait is not None and waited + wait > max_wait:
+            increment("rate_limit_deferred", source=source)
+            raise RateLimitDeferred(source, time.time() + wait)
+
+        logger.info("Waiting %.1f seconds for the shared %s request budget", wait, source)
+        increment("rate_limit_wait_seconds", wait, source=source)
+        time.sleep(wait)
+        waited += wait
+
+
+def record_usage(source, limits, usage, now=None):
+    """Update the shared budget from usage reported by the API, which also counts other apps on the account."""
+    _ensure_tables()
+    now = time.time() if now is None else now
+
+    rows = []
+    for (window_name, _, length), capacity, used in zip(RATE_LIMITS[source], limits, usage):
+        rows.append((source, window_name, _window_start(now, length), used, capacity))
+
+    with get_connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO rate_limits (source, window_name, window_start, used, capacity)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(source, window_name) DO UPDATE SET
+                used = CASE WHEN window_start = excluded.window_start THEN MAX(used, excluded.used) ELSE excluded.used END,
+                window_start = excluded.window_start,
+                capacity = excluded.capacity
+            """,
+            rows,
+        )
+        conn.commit()
+
+
+def record_rate_limited(source, retry_after=None, now=None):
+    """Block a source for every process after a 429 response, doubling the back-off on repeated 429s."""
+    _ensure_tables()
+    now = time.time() if now is None else now
+
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT backoff_seconds FROM rate_limit_backoff WHERE source = ?", (source,)).fetchone()
+        backoff = min(row[0] * 2, BACKOFF_MAX_SECONDS) if row and row[0] else BACKOFF_INITIAL_SECONDS
+        wait = max(backoff, retry_after or 0)
+        conn.execute(
+            """
+            INSERT INTO rate_limit_backoff (source, blocked_until, backoff_seconds)
+            VALUES (?, ?, ?)
+            ON CONFLICT(source) DO UPDATE SET
+                blocked_until = excluded.blocked_until,
+                backoff_seconds = excluded.backoff_seconds
+            """,
+            (source, now + wait, backoff),
+        )
+        conn.commit()
+
+    logger.warning("Rate limited by %s, pausing requests from every job for %.0f seconds", source, wait)
+    return wait
+
+
+def record_success(source):
+    """Reset the back-off of a source once a request succeeds again."""
+    _ensure_tables()
+    with get_connection() as conn:
+        conn.execute("DELETE FROM rate_limit_backoff WHERE source = ? AND blocked_until <= ?", (source, time.time()))
+        conn.commit()
@@ -0,0 +1,87 @@
+# Import required libraries
+import time
+import random
+import datetime
+import email.utils
+import requests
+
+# Import shared configuration and functions from other scripts
+from config import logger, RETRY_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+from metrics import increment
+
+# HTTP status codes worth retrying, as the same request may succeed a moment later
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def error_response(error):
+    """Return the HTTP response behind an error, following the errors it was raised from, as Garmin Connect wraps them."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        if response is not None and getattr(response, "status_code", None):
+            return response
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def status_code(error):
+    """Return the HTTP status code of the response behind an error, or None if it never got one."""
+    response = error_response(error)
+    return response.status_code if response is not None else None
+
+
+def retry_after(error, now=None):
+    """Return the seconds to wait from a Retry-After header on the error response, given in seconds or as a date."""
+    response = error_response(error)
+    value = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return max((retry_at - now).total_seconds(), 0.0)
+
+
+def is_transient(error):
+    """Return whether an error is a dropped connection, a timeout or a transient HTTP status."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return status_code(error) in TRANSIENT_STATUS_CODES
+
+
+def is_safe_to_repeat(error):
+    """Return whether a request that is not safe to send twice can be retried, as it never reached the server or was refused with a Retry-After."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    return status_code(error) in (429, 503) and retry_after(error) is not None
+
+
+def backoff_delay(attempt, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """Return a random delay up to an exponentially growing cap, so retrying jobs do not retry in step."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def with_retries(call, *args, attempts=RETRY_ATTEMPTS, retryable=is_transient, description=None, **kwargs):
+    """Call a function, retrying transient errors with exponential backoff and jitter, honouring Retry-After."""
+    for attempt in range(attempts):
+        try:
+            return call(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1 or not retryable(e):
+                raise
+            # Give up rather than sleep when the server asks for a longer pause than a retry may wait
+            wait = retry_after(e) or 0
+            if wait > RETRY_MAX_DELAY:
+                raise
+            delay = max(backoff_delay(attempt), wait)
+            logger.warning(
+                "Attempt %d of %d for %s failed, retrying in %.1f seconds: %s",
+                attempt + 1, attempts, description or getattr(call, "__name__", "request"), delay, e,
+            )
+            increment("retries")
+            time.sleep(delay)
@@ -1,35 +1,134 @@
 # Import required libraries
 import os
+import re
 import time
-import webbrowser
 import datetime
+import functools
 import pandas as pd
 import requests
 import json
 import tempfile
 import shutil
+import threading
 from pathlib import Path
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 # Import shared configuration and functions
-from utils import safe_json_write, save_debug_screenshot
-from config import logger, check_strava_credentials, ACTIVITY_DAYS_RANGE, DEBUG_SCREENSHOTS
+from utils import safe_json_write, save_debug_screenshot, DownloadWatcher
+from config import logger, configure_logging, check_strava_credentials, ACTIVITY_DAYS_RANGE, DEBUG_SCREENSHOTS, STRAVA_MAX_WORKERS
+from task_tracker import init_db
+from stream_cache import save_streams, load_streams
+from activity_store import get_sync_state, set_sync_state, get_cursor, set_cursor, upsert_activities, replace_activities, load_activity_records
+from activity_schema import STRAVA_SCHEMA, project_records
+from rate_limit import acquire, reserve, record_usage, record_rate_limited, RATE_LIMIT_HEADROOM
+from retry import with_retries
+from http_cache import cached_response, strava_ttl, replaying
+from metrics import span, increment
 
 # Token storage path
 TOKEN_PATH = Path("strava_tokens.json")
 
-# Retrieve credentials and check at the same time
-creds = check_strava_credentials()
-STRAVA_USER = creds["STRAVA_USER"]
-STRAVA_PASS = creds["STRAVA_PASS"]
-STRAVA_CLIENT_ID = creds["STRAVA_CLIENT_ID"]
-STRAVA_CLIENT_SECRET = creds["STRAVA_CLIENT_SECRET"]
-STRAVA_REDIRECT_URI = creds["STRAVA_REDIRECT_URI"]
+
+# Strava API base URL and page size, 200 is the Strava max
+API_BASE_URL = "https://www.strava.com/api/v3"
+PAGE_SIZE = 200
+
+# Share one pooled HTTP session, so TCP and TLS connections are reused between requests
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max(STRAVA_MAX_WORKERS, 1)))
+
+
+class RateLimiter:
+    """Pace Strava API requests through the request budget shared by every job, kept in step with the rate limit headers."""
+
+    def __init__(self, headroom=RATE_LIMIT_HEADROOM):
+        self.headroom = headroom
+
+    def update(self, response, now=None):
+        """Record the limits and usage reported by Strava, preferring the read-specific headers when present."""
+        limit = response.headers.get("X-ReadRateLimit-Limit") or response.headers.get("X-RateLimit-Limit")
+        usage = response.headers.get("X-ReadRateLimit-Usage") or response.headers.get("X-RateLimit-Usage")
+        if not limit or not usage:
+            return
+        try:
+            limits = [int(v) for v in limit.split(",")]
+            used = [int(v) for v in usage.split(",")]
+        except ValueError:
+            logger.debug("Could not parse Strava rate limit headers: %s / %s", limit, usage)
+            return
+        record_usage("strava", limits, used, now)
+
+    def delay(self, now=None):
+        """Take one request from the shared budget, or return how many seconds to wait before trying again."""
+        return reserve("strava", now=now, headroom=self.headroom)
+
+    def wait(self):
+        """Wait until the shared budget allows the next request, deferring the job if the wait is too long."""
+        acquire("strava")
+
+
+RATE_LIMITER = RateLimiter()
+
+
+def api_get(path, headers, params=None):
+    """Send a GET request to the Strava API through the pooled session, paced by the rate limiter and retried on transient errors.
+    Responses are served from the HTTP cache when HTTP_CACHE_MODE allows it."""
+    # Label spans by endpoint without activity IDs, so each endpoint gets one latency histogram
+    endpoint = re.sub(r"\d+", "{id}", path)
+
+    def send():
+        while True:
+            RATE_LIMITER.wait()
+            with span("strava_request", endpoint=endpoint):
+                response = SESSION.get(f"{API_BASE_URL}{path}", headers=headers, params=params, timeout=30)
+            RATE_LIMITER.update(response)
+            increment("strava_response_bytes", len(response.content), endpoint=endpoint)
+            if response.status_code != 429:
+                break
+
+            # Pause every job and wait for the budget again, until the back-off grows past the longest wait
+            retry_after = response.headers.get("Retry-After", "")
+            record_rate_limited("strava", float(retry_after) if retry_after.isdigit() else None)
+
+        response.raise_for_status()
+        return response.json()
+
+    return cached_response(
+        "strava", {"path": path, "params": params},
+        lambda: with_retries(send, description=f"Strava GET {path}"),
+        ttl=strava_ttl(path, params),
+    )
+
+
+def fetch_pages(path, headers, params=None, max_workers=STRAVA_MAX_WORKERS, per_page=PAGE_SIZE):
+    """Fetch every page of a paginated Strava endpoint, fetching pages concurrently after the first."""
+    params = dict(params or {})
+
+    def fetch_page(page):
+        return api_get(path, headers, {**params, "page": page, "per_page": per_page})
+
+    # Most calls fit on one page, so only fan out once the first page comes back full
+    records = fetch_page(1)
+    if len(records) < per_page:
+        return records
+
+    page = 2
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        while True:
+            pages = range(page, page + max(max_workers, 1))
+            results = list(executor.map(fetch_page, pages))
+            for page_data in results:
+                records.extend(page_data)
+                if len(page_data) < per_page:
+                    return records
+            page += len(pages)
+
+
+@functools.cache
+def get_credentials():
+    """Retrieve and check the Strava credentials once, on first use rather than on import."""
+    return check_strava_credentials()
 
 
 def save_tokens(token_data):
@@ -39,11 +138,14 @@ def save_tokens(token_data):
 
 def authenticate():
     """Perform Strava OAuth authentication and return new tokens."""
+    import webbrowser
+
+    creds = get_credentials()
     url = (
         "https://www.strava.com/oauth/authorize"
-        f"?client_id={STRAVA_CLIENT_ID}"
+        f"?client_id={creds['STRAVA_CLIENT_ID']}"
         "&response_type=code"
-        f"&redirect_uri={STRAVA_REDIRECT_URI}"
+        f"&redirect_uri={creds['STRAVA_REDIRECT_URI']}"
         "&approval_prompt=force"
         "&scope=activity:read_all,profile:read_all"
     )
@@ -52,11 +154,11 @@ def authenticate():
     webbrowser.open(url)
     code = input("Paste the code parameter from the URL after approval: ").strip()
 
-    response = requests.post(
-        "https://www.strava.com/api/v3/oauth/token",
+    response = SESSION.post(
+        f"{API_BASE_URL}/oauth/token",
         data={
-            "client_id": STRAVA_CLIENT_ID,
-            "client_secret": STRAVA_CLIENT_SECRET,
+            "client_id": creds["STRAVA_CLIENT_ID"],
+            "client_secret": creds["STRAVA_CLIENT_SECRET"],
             "code": code,
             "grant_type": "authorization_code",
         })
@@ -95,76 +197,333 @@ def load_tokens():
 
 def refresh_access(token):
     """Refresh an expired Strava access token using the refresh token."""
-    response = requests.post(
-        "https://www.strava.com/api/v3/oauth/token",
-        data={
-            "client_id": STRAVA_CLIENT_ID,
-            "client_secret": STRAVA_CLIENT_SECRET,
-            "grant_type": "refresh_token",
-            "refresh_token": token["refresh_token"],
-        },
-    )
-    response.raise_for_status()
-    new_token = response.json()
-    save_tokens(new_token)
-    return new_token
+    creds = get_credentials()
+
+    def send():
+        response = SESSION.post(
+            f"{API_BASE_URL}/oauth/token",
+            data={
+                "client_id": creds["STRAVA_CLIENT_ID"],
+                "client_secret": creds["STRAVA_CLIENT_SECRET"],
+                "grant_type": "refresh_token",
+                "refresh_token": token["refresh_token"],
+            },
+        )
+        response.raise_for_status()
+        return response.json()
 
+    with span("strava_token_refresh"):
+        new_token = with_retries(send, description="Strava token refresh")
 
-def get_latest_activities(days=ACTIVITY_DAYS_RANGE):
-    """Fetch the latest Strava activities within the specified number of days."""
-    token = load_tokens()
-    current_timestamp = datetime.datetime.now(datetime.timezone.utc).timestamp()
-    if token["expires_at"] < current_timestamp:
-        token = refresh_access(token)
+    # Strava returns the same token while it is still valid, so only write when it changes
+    token_fields = ("access_token", "refresh_token", "expires_at")
+    if any(new_token.get(k) != token.get(k) for k in token_fields):
+        save_tokens(new_token)
+    return new_token
 
-    headers = {"Authorization": f"Bearer {token['access_token']}"}
 
-    after = int((datetime.datetime.now() - datetime.timedelta(days=days)).timestamp())
+class TokenManager:
+    """Keep the Strava token in memory and refresh it ahead of expiry, with one refresh for all callers."""
+
+    def __init__(self, refresh_margin=300):
+        self.refresh_margin = refresh_margin
+        self.token = None
+        self.lock = threading.Lock()
+
+    def _is_valid(self, token):
+        """Return whether the token is loaded and not within the refresh margin of expiry."""
+        current_timestamp = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        return token is not None and token.get("expires_at", 0) - self.refresh_margin > current_timestamp
+
+    def get_token(self):
+        """Return a valid token, loading or refreshing it at most once across concurrent callers."""
+        token = self.token
+        if self._is_valid(token):
+            return token
+
+        with self.lock:
+            # Another caller may have refreshed while this one waited for the lock
+            if self.token is None:
+                self.token = load_tokens()
+            if not self._is_valid(self.token):
+                logger.info("Refreshing Strava access token")
+                self.token = refresh_access(self.token)
+            return self.token
+
+    def headers(self):
+        """Return the authorisation headers for the Strava API, or none when replaying recorded responses."""
+        if replaying():
+            return {}
+        return {"Authorization": f"Bearer {self.get_token()['access_token']}"}
+
+
+TOKEN_MANAGER = TokenManager()
+
+
+def fetch_activities_after(after, before=None):
+    """Fetch all Strava activities that started after, and optionally before, the given epoch timestamps, as raw records."""
+    params = {"after": after}
+    if before is not None:
+        params["before"] = before
+    activities = fetch_pages("/athlete/activities", TOKEN_MANAGER.headers(), params)
+    increment("activities_fetched", len(activities), source="strava")
+    return activities
+
+
+def sync_latest_activities(days=ACTIVITY_DAYS_RANGE):
+    """Merge Strava activities newer than the persisted cursor into the local store and return the window."""
+    init_db()
+
+    today = datetime.date.today()
+    # Start the window at midnight, as a full sync replaces whole days in the store
+    window_start = datetime.datetime.combine(today - datetime.timedelta(days=days), datetime.time.min)
+    synced_from, high_water_mark = get_sync_state("strava")
+    cursor = get_cursor("strava")
+
+    if cursor is None or synced_from is None or window_start.date() < synced_from:
+        # Nothing stored for this window yet, so fetch it in full and replace what is stored
+        logger.info("Running full Strava sync for the past %s days", days)
+        activities = fetch_activities_after(int(window_start.timestamp()))
+        replace_activities("strava", activities, window_start.date(), today, "id", "start_date_local")
+        synced_from = min(synced_from, window_start.date()) if synced_from else window_start.date()
+    else:
+        # Only ask Strava for activities that started after the newest one seen
+        after = datetime.datetime.fromisoformat(cursor)
+        logger.info("Running delta Strava sync for activities after %s", cursor)
+        activities = fetch_activities_after(int(after.timestamp()))
+        upsert_activities("strava", activities, "id", "start_date_local")
 
-    activities = []
-    page = 1
-    per_page = 50 # This is the Strava max
+    # Advance the cursor to the newest start date seen, in UTC as returned by Strava
+    start_dates = [a["start_date"].replace("Z", "+00:00") for a in activities if a.get("start_date")]
+    if cursor:
+        start_dates.append(cursor)
+    if start_dates:
+        set_cursor("strava", max(start_dates, key=lambda d: datetime.datetime.fromisoformat(d)))
+
+    set_sync_state("strava", synced_from, max(high_water_mark, today) if high_water_mark else today)
+    return project_records(load_activity_records("strava", window_start.date(), today), STRAVA_SCHEMA)
 
-    while True:
-        params = {"after": after, "page": page, "per_page": per_page}
-        response = requests.get("https://www.strava.com/api/v3/athlete/activities",
-                                headers=headers, params=params)
-        response.raise_for_status()
-        page_data = response.json()
 
-        if not page_data:
-            break
+def get_latest_activities(days=ACTIVITY_DAYS_RANGE, delta=False):
+    """Fetch the latest Strava activities within the specified number of days, projected onto the compact schema."""
+    if delta:
+        return sync_latest_activities(days)
 
-        activities.extend(page_data)
-        page += 1
-        time.sleep(0.2) # API rate limit safety
+    after = int((datetime.datetime.now() - datetime.timedelta(days=days)).timestamp())
+    activities = fetch_activities_after(after)
 
     if not activities:
         return pd.DataFrame()
 
-    return pd.DataFrame(activities)
+    return project_records(activities, STRAVA_SCHEMA)
 
 
 def get_stream(activity_id, types=("heartrate", "cadence", "distance", "time")):
     """Fetch detailed data streams for a given Strava activity."""
-    token = load_tokens()
-    current_timestamp = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
-    if token.get("expires_at", 0) < current_timestamp:
-        token = refresh_access(token)
-
-    headers = {"Authorization": f"Bearer {token['access_token']}"}
-    response = requests.get(
-        f"https://www.strava.com/api/v3/activities/{activity_id}/streams",
-        headers=headers,
+    return api_get(
+        f"/activities/{activity_id}/streams",
+        TOKEN_MANAGER.headers(),
         params={"keys": ",".join(types), "key_by_type": True}
     )
+
+
+def get_streams(activity_ids, types=("heartrate", "cadence", "distance", "time"), max_workers=STRAVA_MAX_WORKERS):
+    """Return streams for many Strava activities, served from the local cache and fetching the rest concurrently."""
+    types = tuple(types)
+    streams = {}
+    missing = []
+    for activity_id in activity_ids:
+        cached = load_streams(activity_id, types)
+        if cached is None:
+            missing.append(activity_id)
+        else:
+            streams[activity_id] = cached
+
+    if not missing:
+        return streams
+
+    logger.info("Fetching streams for %d activities from Strava, %d served from cache", len(missing), len(streams))
+
+    def fetch(activity_id):
+        save_streams(activity_id, get_stream(activity_id, types), types)
+        return load_streams(activity_id, types)
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        futures = {activity_id: executor.submit(fetch, activity_id) for activity_id in missing}
+        for activity_id, future in futures.items():
+            try:
+                streams[activity_id] = future.result()
+            except Exception as e:
+                logger.error("Error fetching streams for activity %s: %s", activity_id, e, exc_info=True)
+
+    return streams
+
+
+def login_to_strava(driver):
+    """Log in to Strava in the given Selenium browser session."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    creds = get_credentials()
+
+    # Log in to Strava profile
+    logger.info("Opening the Strava login page")
+    driver.get("https://www.strava.com/login")
+
+    # Handle cookie banner if present
+    try:
+        logger.info("Checking for cookie banner")
+        save_debug_screenshot(driver, logger, DEBUG_SCREENSHOTS, "before_cookie_banner")
+        cookie_accept = WebDriverWait(driver, 5).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-cy='accept-cookies'], .CookieBanner button, button[id*='cookie'], button[class*='cookie']"))
+        )
+        cookie_accept.click()
+        logger.info("Cookie banner accepted")
+        time.sleep(2)
+    except Exception:
+        logger.debug("No cookie banner found or already accepted")
+
+    # Enter e-mail for the login page
+    logger.info("Entering e-mail on Strava login page")
+    email_field = WebDriverWait(driver, 20).until(
+        EC.presence_of_element_located((By.ID, "mobile-email"))
+    )
+    email_field.clear()
+    email_field.send_keys(creds["STRAVA_USER"])
+
+    # Click the login button to proceed to password stage
+    logger.info("Sending e-mail on Strava login page")
+    save_debug_screenshot(driver, logger, DEBUG_SCREENSHOTS, "before_username_submit")
+    login_button_email_stage = WebDriverWait(driver, 20).until(
+        EC.element_to_be_clickable((By.ID, "mobile-login-button"))
+    )
+    driver.execute_script("arguments[0].click();", login_button_email_stage)
+
+    # Wait for the OTP page to load and click button to use password instead
+    logger.info("Waiting for OTP page and clicking button to use password instead")
+    save_debug_screenshot(driver, logger, DEBUG_SCREENSHOTS, "before_use_password")
+    use_password_btn = WebDriverWait(driver, 20).until(
+        EC.element_to_be_clickable((By.CSS_SELECTOR, "[data-testid='use-password-cta'] button"))
+    )
+    driver.execute_script("arguments[0].click();", use_password_btn)
+
+    # Enter the password to log in to Strava
+    logger.info("Entering password on login page")
+    password_field = WebDriverWait(driver, 20).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, "input[data-cy='password']"))
+    )
+    password_field.clear()
+    password_field.send_keys(creds["STRAVA_PASS"])
+
+    # Click the final login button
+    logger.info("Clicking final login button")
+    login_button_password_stage = WebDriverWait(driver, 20).until(
+        EC.element_to_be_clickable((By.CSS_SELECTOR, "button[type='submit'].Button_primary___8ywh"))
+    )
+    driver.execute_script("arguments[0].click();", login_button_password_stage)
+
+    # Wait for the login to complete
+    logger.info("Waiting for login to complete")
+    WebDriverWait(driver, 30).until(EC.url_contains("dashboard"))
+    logger.info("Login successful, starting activity downloads")
+
+
+def session_from_driver(driver):
+    """Return a pooled HTTP session carrying the cookies and user agent of a logged in browser."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max(STRAVA_MAX_WORKERS, 1)))
+    session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent;")
+    for cookie in driver.get_cookies():
+        session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+    return session
+
+
+def download_activity_file(session, activity_id, download_dir):
+    """Download the original activity file for one Strava activity over HTTP and return its path."""
+    response = session.get(f"https://www.strava.com/activities/{activity_id}/export_original", stream=True, timeout=60)
     response.raise_for_status()
-    return response.json()
 
+    # Strava redirects to an HTML page instead of a file when the session is not accepted
+    if response.headers.get("Content-Type", "").startswith("text/html"):
+        raise RuntimeError(f"Strava returned a web page instead of the file for activity {activity_id}")
+
+    # Keep only the extension of the server file name, as different activities often share the same original name
+    suffix = ".fit"
+    disposition = response.headers.get("Content-Disposition", "")
+    if "filename=" in disposition:
+        original_name = os.path.basename(disposition.split("filename=")[-1].split(";")[0].strip().strip('"'))
+        suffixes = Path(original_name).suffixes
+        # Keep the format extension in front of a compression extension, as in .fit.gz
+        suffix = "".join(suffixes[-2:] if suffixes[-1:] == [".gz"] else suffixes[-1:]) or suffix
+    filename = f"{activity_id}{suffix}"
+
+    # Write to a partial file first, so watchers never pick up a half-written download
+    file_path = Path(download_dir) / filename
+    partial_path = file_path.with_name(file_path.name + ".part")
+    with open(partial_path, "wb") as f:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            f.write(chunk)
+            increment("strava_download_bytes", len(chunk))
+    partial_path.replace(file_path)
+    return str(file_path)
+
+
+def download_activity_files(session, activity_ids, download_dir, max_workers=STRAVA_MAX_WORKERS, on_downloaded=None):
+    """Download original activity files concurrently over HTTP, returning paths in input order or None on failure."""
+    def download(activity_id):
+        try:
+            with span("strava_download", method="http"):
+                file_path = with_retries(download_activity_file, session, activity_id, download_dir,
+                                         description=f"Strava download of activity {activity_id}")
+            logger.info("Successfully downloaded: %s", file_path)
+            if on_downloaded:
+                on_downloaded(activity_id, file_path)
+            return file_path
+        except Exception as e:
+            logger.warning("HTTP download failed for activity %s: %s", activity_id, e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        return list(executor.map(download, activity_ids))
+
+
+def download_with_browser(driver, watcher, activity_id):
+    """Download one activity file by clicking the export link in the browser and return its path."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.common.action_chains import ActionChains
+
+    # Navigate to activity page
+    activity_url = f"https://www.strava.com/activities/{activity_id}"
+    driver.get(activity_url)
+
+    # Click dropdown menu to reveal export options
+    dropdown_button = WebDriverWait(driver, 15).until(
+        EC.element_to_be_clickable((By.CSS_SELECTOR, "button.slide-menu.drop-down-menu"))
+    )
+    ActionChains(driver).move_to_element(dropdown_button).click().perform()
+
+    # Click the export file button
+    export_link = WebDriverWait(driver, 15).until(
+        EC.element_to_be_clickable(
+            (By.XPATH, f"//a[contains(@href, '/activities/{activity_id}/export_original')]")
+        )
+    )
+    ActionChains(driver).move_to_element(export_link).click().perform()
+
+    # Wait for the file to be finalised, ignoring partial downloads
+    return watcher.wait_for_file(timeout=60)
+
+
+def download_multiple_activities(activities_df, download_dir=None, use_browser=False, on_downloaded=None):
+    """Download multiple FIT files from Strava, logging in with Selenium once and exporting files over HTTP."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
 
-def download_multiple_activities(activities_df, download_dir=None):
-    """Download multiple FIT files from Strava using Selenium with a single login session."""
-    if not STRAVA_USER or not STRAVA_PASS:
+    creds = get_credentials()
+    if not creds["STRAVA_USER"] or not creds["STRAVA_PASS"]:
         raise RuntimeError("Strava username and password must be set in config.py")
 
     options = Options()
@@ -200,128 +559,55 @@ def download_multiple_activities(activities_df, download_dir=None):
     }
     options.add_experimental_option("prefs", prefs)
 
-    driver = webdriver.Chrome(options=options)
+    with span("strava_browser_start"):
+        driver = webdriver.Chrome(options=options)
     downloaded_files = []
+    watcher = None
 
     try:
-        # Log in to Strava profile
-        logger.info("Opening the Strava login page")
-        driver.get("https://www.strava.com/login")
-
-        # Handle cookie banner if present
-        try:
-            logger.info("Checking for cookie banner")
-            save_debug_screenshot(driver, logger, DEBUG_SCREENSHOTS, "before_cookie_banner")
-            cookie_accept = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-cy='accept-cookies'], .CookieBanner button, button[id*='cookie'], button[class*='cookie']"))
+        with span("strava_browser_login"):
+            login_to_strava(driver)
+        activity_ids = list(activities_df["id"])
+
+        # Reuse the browser session cookies to export files directly, without page loads
+        # The on_downloaded callback runs as soon as each file is finished, possibly from a worker thread
+        if use_browser:
+            downloaded_files = [None] * len(activity_ids)
+        else:
+            logger.info("Starting HTTP download of %d activities", len(activity_ids))
+            downloaded_files = download_activity_files(
+                session_from_driver(driver), activity_ids, download_dir, on_downloaded=on_downloaded
             )
-            cookie_accept.click()
-            logger.info("Cookie banner accepted")
-            time.sleep(2)
-        except Exception:
-            logger.debug("No cookie banner found or already accepted")
 
-        # Enter e-mail for the login page
-        logger.info("Entering e-mail on Strava login page")
-        email_field = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.ID, "mobile-email"))
-        )
-        email_field.clear()
-        email_field.send_keys(STRAVA_USER)
-
-        # Click the login button to proceed to password stage
-        logger.info("Sending e-mail on Strava login page")
-        save_debug_screenshot(driver, logger, DEBUG_SCREENSHOTS, "before_username_submit")
-        login_button_email_stage = WebDriverWait(driver, 20).until(
-            EC.element_to_be_clickable((By.ID, "mobile-login-button"))
-        )
-        driver.execute_script("arguments[0].click();", login_button_email_stage)
+        # Fall back to clicking through the browser for any activity the HTTP export did not return
+        watcher = DownloadWatcher(download_dir)
+        for index, row in enumerate(activities_df.itertuples(index=False)):
+            if downloaded_files[index]:
+                continue
 
-        # Wait for the OTP page to load and click button to use password instead
-        logger.info("Waiting for OTP page and clicking button to use password instead")
-        save_debug_screenshot(driver, logger, DEBUG_SCREENSHOTS, "before_use_password")
-        use_password_btn = WebDriverWait(driver, 20).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, "[data-testid='use-password-cta'] button"))
-        )
-        driver.execute_script("arguments[0].click();", use_password_btn)
-
-        # Enter the password to log in to Strava
-        logger.info("Entering password on login page")
-        password_field = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input[data-cy='password']"))
-        )
-        password_field.clear()
-        password_field.send_keys(STRAVA_PASS)
-
-        # Click the final login button
-        logger.info("Clicking final login button")
-        login_button_password_stage = WebDriverWait(driver, 20).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, "button[type='submit'].Button_primary___8ywh"))
-        )
-        driver.execute_script("arguments[0].click();", login_button_password_stage)
-
-        # Wait for the login to complete
-        logger.info("Waiting for login to complete")
-        WebDriverWait(driver, 30).until(EC.url_contains("dashboard"))
-        logger.info("Login successful, starting activity downloads")
-
-        # Download each relevant activity file
-        for index, row in activities_df.iterrows():
-            activity_id = row["id"]
-            activity_name = row.get("name", "")
-            
+            activity_id = row.id
+            activity_name = getattr(row, "name", "")
             try:
-                logger.info("Downloading activity %d/%d: %s (ID: %s)", index + 1, len(activities_df), activity_name, activity_id)
-
-                # Navigate to activity page
-                activity_url = f"https://www.strava.com/activities/{activity_id}"
-                driver.get(activity_url)
-
-                # Click dropdown menu to reveal export options
-                dropdown_button = WebDriverWait(driver, 15).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, "button.slide-menu.drop-down-menu"))
-                )
-                ActionChains(driver).move_to_element(dropdown_button).click().perform()
-
-                # Click the export file button
-                export_link = WebDriverWait(driver, 15).until(
-                    EC.element_to_be_clickable(
-                        (By.XPATH, f"//a[contains(@href, '/activities/{activity_id}/export_original')]")
-                    )
-                )
-                ActionChains(driver).move_to_element(export_link).click().perform()
-
-                # Wait for file to download
-                download_start_time = time.time()
-                file_path = None
-                while True:
-                    files = [f for f in os.listdir(download_dir) if os.path.isfile(os.path.join(download_dir, f))]
-                    for filename in files:
-                        full_path = os.path.join(download_dir, filename)
-                        if os.path.getctime(full_path) > download_start_time:
-                            file_path = full_path
-                            break
-                    if file_path or time.time() - download_start_time > 60:
-                        break
-                    time.sleep(2)
+                logger.info("Downloading activity %d/%d in browser: %s (ID: %s)", index + 1, len(activities_df), activity_name, activity_id)
+                with span("strava_download", method="browser"):
+                    file_path = download_with_browser(driver, watcher, activity_id)
 
                 if file_path:
-                    downloaded_files.append(file_path)
+                    downloaded_files[index] = file_path
                     logger.info("Successfully downloaded: %s", file_path)
+                    if on_downloaded:
+                        on_downloaded(activity_id, file_path)
                 else:
-                    downloaded_files.append(None)
                     logger.warning("Failed to download activity %s", activity_id)
 
-                # Add short delay between downloads
-                time.sleep(2)
-
             except Exception as e:
                 logger.error("Error downloading activity %s: %s", activity_id, e, exc_info=True)
-                downloaded_files.append(None)
 
         return downloaded_files
 
     finally:
+        if watcher is not None:
+            watcher.close()
         driver.quit()
         try:
             shutil.rmtree(user_data_dir, ignore_errors=True)
@@ -331,15 +617,16 @@ def download_multiple_activities(activities_df, download_dir=None):
             shutil.rmtree(download_dir, ignore_errors=True)
 
 
-def get_virtual_ride_activities(days=ACTIVITY_DAYS_RANGE):
+def get_virtual_ride_activities(days=ACTIVITY_DAYS_RANGE, delta=False):
     """Fetch recent Strava activities filtered for virtual ride type."""
-    df = get_latest_activities(days=days)
+    df = get_latest_activities(days=days, delta=delta)
     if df.empty:
         return pd.DataFrame()
     return df[df['type'] == 'VirtualRide'].copy()
 
 
 if __name__ == "__main__":
+    configure_logging()
     logger.info("Fetching activities from the past %s days", ACTIVITY_DAYS_RANGE)
     df = get_latest_activities()
 
@@ -1,27 +1,63 @@
 # Import required libraries
+import queue
+import threading
 import tempfile
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 # Import shared configuration and functions from other scripts
-from config import logger, ACTIVITY_DAYS_RANGE
-from task_tracker import init_db, is_uploaded_to_garmin, mark_uploaded_to_garmin
+from config import logger, configure_logging, ACTIVITY_DAYS_RANGE, GARMIN_UPLOAD_WORKERS
+from task_tracker import init_db, filter_not_uploaded, mark_uploaded_to_garmin
 from strava import get_virtual_ride_activities, download_multiple_activities
-from garmin_connect import upload_activity_file_to_garmin, check_garmin_credentials
+from garmin_connect import upload_activity_file_to_garmin, check_garmin_credentials, get_api
+from cross_source import fetch_concurrently
+from metrics import run_metrics
+
+def upload_worker(upload_queue, results, results_lock, garmin_creds, dry_run):
+    """Upload queued activity files to Garmin Connect until a stop marker is received."""
+    while True:
+        item = upload_queue.get()
+        if item is None:
+            break
+
+        activity_id, file_path = item
+        if dry_run:
+            logger.info("Dry run enabled: Would upload %s (activity %s)", file_path, activity_id)
+            success = True
+        else:
+            try:
+                success = upload_activity_file_to_garmin(file_path, creds=garmin_creds)
+                if success:
+                    # Record each upload straight away, so a crash mid-batch loses nothing
+                    mark_uploaded_to_garmin(str(activity_id))
+            except Exception as e:
+                logger.error("Failed to upload %s to Garmin Connect: %s", file_path, e)
+                success = False
+
+        with results_lock:
+            results[str(activity_id)] = success
+
 
 def sync_virtual_rides(dry_run=False, limit=None, headless=True):
     """Synchronise activities of the type virtual ride from Strava to Garmin Connect."""
     init_db()
 
-    # Get virtual ride activities from Strava within the defined date range
+    # Get virtual ride activities from Strava while logging in to Garmin Connect, before upload workers share the session
     logger.info("Fetching virtual ride activities from Strava for the last %s days", ACTIVITY_DAYS_RANGE)
-    df = get_virtual_ride_activities(days=ACTIVITY_DAYS_RANGE)
+    garmin_creds = check_garmin_credentials()
+    results = fetch_concurrently({
+        "strava": lambda: get_virtual_ride_activities(days=ACTIVITY_DAYS_RANGE, delta=True),
+        "garmin": lambda: None if dry_run else get_api(garmin_creds),
+    })
+    df = results["strava"]
 
     if df.empty:
         logger.info("No new virtual ride activities found on Strava.")
         return 0, 0
 
-    # Filter out already synced activities
-    df_to_download = df[~df['id'].astype(str).apply(is_uploaded_to_garmin)]
+    # Filter out already synced activities with one query for the whole batch
+    not_uploaded = set(filter_not_uploaded(df['id']))
+    df_to_download = df[df['id'].astype(str).isin(not_uploaded)]
     if df_to_download.empty:
         logger.info("All virtual ride activities have already been synced.")
         return 0, 0
@@ -31,46 +67,42 @@ def sync_virtual_rides(dry_run=False, limit=None, headless=True):
 
     logger.info("Starting bulk download of %d virtual ride activities", len(df_to_download))
 
-    uploaded_count = 0
-    failed_count = 0
+    upload_queue = queue.Queue()
+    results = {}
+    results_lock = threading.Lock()
 
     # Use a temporary directory for downloads
     with tempfile.TemporaryDirectory() as tmp_download_dir:
         logger.info("Using temporary download directory: %s", tmp_download_dir)
-        downloaded_files = download_multiple_activities(df_to_download, download_dir=tmp_download_dir)
-
-        # Upload the activity to Garmin Connect
-        logger.info("Starting Garmin Connect upload for downloaded activities")
-        garmin_creds = check_garmin_credentials()
-        for activity_id, file_path in zip(df_to_download['id'], downloaded_files):
-            if file_path is None:
-                failed_count += 1
-                continue
-
-            if dry_run:
-                logger.info("Dry run enabled: Would upload %s (activity %s)", file_path, activity_id)
-                uploaded_count += 1
-                continue
 
+        # Upload each file to Garmin Connect as soon as it is downloaded, while the rest are still downloading
+        workers = max(GARMIN_UPLOAD_WORKERS, 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(workers):
+                executor.submit(upload_worker, upload_queue, results, results_lock, garmin_creds, dry_run)
             try:
-                if upload_activity_file_to_garmin(file_path, creds=garmin_creds):
-                    mark_uploaded_to_garmin(str(activity_id))
-                    uploaded_count += 1
-                else:
-                    failed_count += 1
-            except Exception as e:
-                logger.error("Failed to upload %s to Garmin Connect: %s", file_path, e)
-                failed_count += 1
-
+                download_multiple_activities(
+                    df_to_download,
+                    download_dir=tmp_download_dir,
+                    on_downloaded=lambda activity_id, file_path: upload_queue.put((activity_id, file_path)),
+                )
+            finally:
+                for _ in range(workers):
+                    upload_queue.put(None)
+
+    uploaded_count = sum(1 for success in results.values() if success)
+    failed_count = len(df_to_download) - uploaded_count
     logger.info("Sync complete, uploaded %d, failed %d", uploaded_count, failed_count)
     return uploaded_count, failed_count
 
 
 if __name__ == "__main__":
+    configure_logging()
     parser = argparse.ArgumentParser(description="Sync virtual rides from Strava to Garmin Connect")
     parser.add_argument("--dry-run", action="store_true", help="Do not perform uploads, just simulate")
     parser.add_argument("--limit", type=int, help="Limit number of activities to sync")
     parser.add_argument("--headless", action="store_true", help="Run browser in headless mode (default)")
     args = parser.parse_args()
 
-    sync_virtual_rides(dry_run=args.dry_run, limit=args.limit, headless=args.headless)
+    with run_metrics("strava_garmin_sync"):
+        sync_virtual_rides(dry_run=args.dry_run, limit=args.limit, headless=args.headless)
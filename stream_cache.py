@@ -0,0 +1,68 @@
+# Import required libraries
+import os
+import numpy as np
+
+# Import shared configuration and functions from other scripts
+from config import logger, CACHE_DIR
+from utils import ensure_dir
+
+# Compact dtypes for each Strava stream type, anything else is stored as float64
+STREAM_DTYPES = {
+    "time": np.int32,
+    "distance": np.float32,
+    "heartrate": np.int16,
+    "cadence": np.int16,
+    "watts": np.int16,
+    "temp": np.int8,
+    "altitude": np.float32,
+    "velocity_smooth": np.float32,
+    "grade_smooth": np.float32,
+    "latlng": np.float64,
+    "moving": np.bool_,
+}
+
+
+def stream_dir(activity_id):
+    """Return the cache directory holding the streams for one activity."""
+    return CACHE_DIR / "streams" / str(activity_id)
+
+
+def to_array(stream_type, data):
+    """Convert a list of stream values to a compact typed array, using NaN for missing samples."""
+    dtype = STREAM_DTYPES.get(stream_type, np.float64)
+    try:
+        return np.asarray(data, dtype=dtype)
+    except (TypeError, ValueError):
+        # Integer streams cannot hold gaps, so fall back to floats when samples are missing
+        return np.asarray([np.nan if v is None else v for v in data], dtype=np.float32)
+
+
+def save_streams(activity_id, streams, types):
+    """Save streams keyed by type for an activity, storing an empty array for types Strava did not return."""
+    directory = ensure_dir(stream_dir(activity_id))
+    for stream_type in types:
+        data = (streams.get(stream_type) or {}).get("data", [])
+        array = to_array(stream_type, data)
+        tmp = directory / f"{stream_type}.tmp.npy"
+        np.save(tmp, array, allow_pickle=False)
+        os.replace(tmp, directory / f"{stream_type}.npy")
+
+
+def load_streams(activity_id, types):
+    """Load cached streams for an activity as memory-mapped arrays, or None if any type is missing."""
+    directory = stream_dir(activity_id)
+    paths = {stream_type: directory / f"{stream_type}.npy" for stream_type in types}
+    if not all(path.exists() for path in paths.values()):
+        return None
+
+    streams = {}
+    for stream_type, path in paths.items():
+        try:
+            array = np.load(path, mmap_mode="r", allow_pickle=False)
+        except ValueError:
+            # Zero-length arrays cannot be memory-mapped, so read those normally
+            array = np.load(path, allow_pickle=False)
+        if array.size:
+            streams[stream_type] = array
+    logger.debug("Loaded cached streams for activity %s", activity_id)
+    return streams
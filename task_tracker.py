@@ -1,22 +1,54 @@
 # Import required libraries
 import os
+import json
 import sqlite3
+import threading
 from contextlib import contextmanager
 
+# Import shared configuration and functions from other scripts
+from metrics import span
+
 # Define the path to the local SQLite database file
 DB_PATH = os.path.join(os.path.dirname(__file__), "sync_tracker.db")
 
+# Keep one open connection per thread, since SQLite connections cannot be shared across threads
+_local = threading.local()
+
+
+def _connect():
+    """Return the reusable connection for this thread, opening a new one if the database path changed."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
 
-@contextmanager
-def get_connection():
-    """Provide a transactional scope around SQLite DB operations."""
     conn = sqlite3.connect(DB_PATH)
-    try:
-        # Enable write-ahead logging for concurrency and durability
-        conn.execute("PRAGMA journal_mode=WAL;")
-        yield conn
-    finally:
+    # Enable write-ahead logging for concurrency and durability, once per connection
+    conn.execute("PRAGMA journal_mode=WAL;")
+    _local.conn, _local.path = conn, DB_PATH
+    return conn
+
+
+def close_connection():
+    """Close the reusable connection for this thread, if one is open."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
         conn.close()
+        _local.conn = None
+
+
+@contextmanager
+def get_connection():
+    """Provide a transactional scope around SQLite DB operations on a reusable connection."""
+    conn = _connect()
+    with span("db_transaction"):
+        try:
+            yield conn
+        except Exception:
+            # Leave the reused connection clean for the next caller
+            conn.rollback()
+            raise
 
 
 def init_db():
@@ -40,6 +72,86 @@ def init_db():
             )
         """)
 
+        # Track content hashes of activity files uploaded to Garmin Connect, to skip identical files
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS uploaded_files (
+                sha256 TEXT PRIMARY KEY,
+                file_path TEXT,
+                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Store raw activity payloads locally, so date range queries avoid the APIs
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS activities (
+                source TEXT NOT NULL,
+                activity_id TEXT NOT NULL,
+                start_time TEXT,
+                payload TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (source, activity_id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_activities_start ON activities (source, start_time)")
+
+        # Track the date range already synchronised into the local activity store per source
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                source TEXT PRIMARY KEY,
+                synced_from TEXT,
+                high_water_mark TEXT,
+                cursor TEXT,
+                synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Materialised daily, weekly and monthly totals per activity type, kept in step with the activities table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS activity_rollups (
+                source TEXT NOT NULL,
+                period TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                activity_type TEXT NOT NULL,
+                activity_count INTEGER NOT NULL DEFAULT 0,
+                distance REAL NOT NULL DEFAULT 0,
+                duration REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (source, period, period_start, activity_type)
+            )
+        """)
+
+        # Requests used per rate limit window and source, shared by every process using the same accounts
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                source TEXT NOT NULL,
+                window_name TEXT NOT NULL,
+                window_start REAL NOT NULL,
+                used INTEGER NOT NULL DEFAULT 0,
+                capacity INTEGER NOT NULL,
+                PRIMARY KEY (source, window_name)
+            )
+        """)
+
+        # Track when a source may be called again after a 429 response, and the current back-off length
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_backoff (
+                source TEXT PRIMARY KEY,
+                blocked_until REAL NOT NULL,
+                backoff_seconds REAL NOT NULL
+            )
+        """)
+
+        # Track date slices already ingested by the backfill command, so it can resume where it stopped
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+                source TEXT NOT NULL,
+                slice_start TEXT NOT NULL,
+                slice_end TEXT NOT NULL,
+                activity_count INTEGER,
+                completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (source, slice_start, slice_end)
+            )
+        """)
+
         conn.commit()
 
 
@@ -56,6 +168,16 @@ def mark_task_created(activity_id):
         conn.commit()
 
 
+def existing_tasks(activity_ids):
+    """Return the subset of activity IDs that already have a Garmin Connect task, using a single query."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT activity_id FROM garmin_tasks WHERE activity_id IN (SELECT value FROM json_each(?))",
+            (json.dumps([str(a) for a in activity_ids]),),
+        ).fetchall()
+    return {row[0] for row in rows}
+
+
 def is_uploaded_to_garmin(activity_id):
     """Check if a Strava activity has already been uploaded to Garmin Connect."""
     with get_connection() as conn:
@@ -69,3 +191,45 @@ def mark_uploaded_to_garmin(activity_id):
     with get_connection() as conn:
         conn.execute("INSERT OR IGNORE INTO strava_garmin_sync (strava_activity_id) VALUES (?)", (activity_id,))
         conn.commit()
+
+
+def filter_not_uploaded(activity_ids):
+    """Return the Strava activity IDs not yet uploaded to Garmin Connect, in input order, using a single query."""
+    activity_ids = [str(a) for a in activity_ids]
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT strava_activity_id FROM strava_garmin_sync WHERE strava_activity_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(activity_ids),),
+        ).fetchall()
+    uploaded = {row[0] for row in rows}
+    return [a for a in activity_ids if a not in uploaded]
+
+
+def is_file_uploaded(sha256):
+    """Check if an activity file with the given content hash has already been uploaded to Garmin Connect."""
+    with get_connection() as conn:
+        return conn.execute("SELECT 1 FROM uploaded_files WHERE sha256 = ?", (sha256,)).fetchone() is not None
+
+
+def mark_file_uploaded(sha256, file_path):
+    """Mark an activity file content hash as uploaded to Garmin Connect."""
+    with get_connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO uploaded_files (sha256, file_path) VALUES (?, ?)", (sha256, str(file_path)))
+        conn.commit()
+
+
+def completed_slices(source):
+    """Return the (slice_start, slice_end) ISO date pairs already backfilled for a source."""
+    with get_connection() as conn:
+        rows = conn.execute("SELECT slice_start, slice_end FROM backfill_checkpoints WHERE source = ?", (source,)).fetchall()
+    return {(row[0], row[1]) for row in rows}
+
+
+def mark_slice_completed(source, slice_start, slice_end, activity_count):
+    """Checkpoint a backfilled date slice for a source."""
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO backfill_checkpoints (source, slice_start, slice_end, activity_count) VALUES (?, ?, ?, ?)",
+            (source, slice_start, slice_end, activity_count),
+        )
+        conn.commit()
@@ -1,10 +1,13 @@
 # Import required libraries
 import sys
 import types
+import pytest
 
 # Define lightweight, fake Garmin class instead of calling real Garmin Connect API
 # Simulate login, fetch activities and upload files in a predictable, testable way
 class MockGarmin:
+    garmin_connect_activities = "/activitylist-service/activities/search/activities"
+
     def __init__(self, email=None, password=None, **kwargs):
         self.user, self.pw = email, password
         self.kwargs = kwargs
@@ -25,6 +28,18 @@ class MockGarmin:
             "averageHR": 140   # Beats per minute
         }]
 
+    def connectapi(self, path, params=None):
+        # Return one page of 250 fake activities from the activity search, paged with start and limit
+        start, limit = int(params["start"]), int(params["limit"])
+        return [{
+            "activityId": i,
+            "activityName": "Run",
+            "activityType": {"typeKey": "running"},
+            "startTimeLocal": "2024-01-01T10:00:00",
+            "duration": 1800,
+            "averageHR": 140
+        } for i in range(start, min(start + limit, 250))]
+
     def upload_activity(self, file_path):
         # Simulate upload success unless file name contains "fail"
         if "fail" in str(file_path):
@@ -32,14 +47,31 @@ class MockGarmin:
         return True
 
 # Define fake Garmin exceptions, needed because Garmin Connect script imports them
+# Each type is its own class, since errors are handled differently by type
 class DummyError(Exception):
     pass
 
+class DummyAuthenticationError(DummyError):
+    pass
+
+class DummyConnectionError(DummyError):
+    pass
+
+class DummyTooManyRequestsError(DummyError):
+    pass
+
 # Garmin Connect script imports Garmin and related exceptions from the Garmin Connect package
 # To avoid using real package, mock versions are injected so that test doubles are used instead on import
 sys.modules['garminconnect'] = types.SimpleNamespace(
     Garmin=MockGarmin,
-    GarminConnectAuthenticationError=DummyError,
-    GarminConnectConnectionError=DummyError,
-    GarminConnectTooManyRequestsError=DummyError,
+    GarminConnectAuthenticationError=DummyAuthenticationError,
+    GarminConnectConnectionError=DummyConnectionError,
+    GarminConnectTooManyRequestsError=DummyTooManyRequestsError,
 )
+
+# Keep every test away from the real tracker database, since API calls record their usage in it
+@pytest.fixture(autouse=True)
+def isolated_db(monkeypatch, tmp_path):
+    """Monkeypatch the DB_PATH to use a temporary file for each test."""
+    import task_tracker
+    monkeypatch.setattr(task_tracker, "DB_PATH", str(tmp_path / "isolated_sync_tracker.db"))
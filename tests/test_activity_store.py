@@ -0,0 +1,105 @@
+# Import required libraries
+import os
+import sys
+import datetime
+import pandas as pd
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import task_tracker
+import activity_store
+import garmin_connect
+
+def test_incremental_sync_only_fetches_after_high_water_mark(monkeypatch):
+    """
+    GIVEN a local activity store that has already synced the year so far
+    WHEN sync_activities() is called again a few days later
+    THEN it should only fetch from the high-water mark minus the overlap window
+         and the store should still hold every activity for the year.
+    """
+    calls = []
+    run_dates = [datetime.date(2024, 1, 5), datetime.date(2024, 3, 1), datetime.date(2024, 3, 8)]
+
+    def fake_fetch_data(start_date, end_date, creds=None, **kwargs):
+        calls.append((start_date, end_date))
+        return pd.DataFrame([{
+            "activityId": day.toordinal(),
+            "activityType": {"typeKey": "running"},
+            "startTimeLocal": f"{day.isoformat()} 10:00:00",
+            "distance": 5000.0
+        } for day in run_dates if start_date <= day <= end_date])
+
+    monkeypatch.setattr(garmin_connect, "fetch_data", fake_fetch_data)
+
+    start = datetime.date(2024, 1, 1)
+    garmin_connect.sync_activities(start, datetime.date(2024, 3, 1))
+    garmin_connect.sync_activities(start, datetime.date(2024, 3, 10))
+    records = activity_store.load_activity_records("garmin", start, datetime.date(2024, 3, 10))
+
+    assert calls[0] == (start, datetime.date(2024, 3, 1))
+    assert calls[1] == (datetime.date(2024, 3, 1) - datetime.timedelta(days=garmin_connect.SYNC_OVERLAP_DAYS), datetime.date(2024, 3, 10))
+    assert len(calls) == 2
+    assert {r["activityId"] for r in records} == {day.toordinal() for day in run_dates}
+
+def test_rollups_follow_added_and_edited_activities():
+    """
+    GIVEN a run and a triathlon with a running leg stored in the local store
+    WHEN the run is edited to a longer distance and moved to another month
+    THEN the monthly and weekly rollups should reflect the edit without counting the old version,
+         and the running leg should be counted under running.
+    """
+    task_tracker.init_db()
+    run = {"activityId": 1, "activityType": {"typeKey": "running"}, "startTimeLocal": "2024-01-31 10:00:00", "distance": 5000.0, "duration": 1500.0}
+    triathlon = {"activityId": 2, "activityType": {"typeKey": "multisport"}, "startTimeLocal": "2024-02-03 10:00:00", "distance": 51500.0, "laps": [
+        {"activityType": {"typeKey": "cycling"}, "distance": 40000},
+        {"activityType": {"typeKey": "running"}, "distance": 10000},
+    ]}
+    activity_store.upsert_activities("garmin", [run, triathlon], "activityId", "startTimeLocal")
+    activity_store.upsert_activities("garmin", [{**run, "startTimeLocal": "2024-02-01 10:00:00", "distance": 8000.0}], "activityId", "startTimeLocal")
+
+    monthly = activity_store.load_rollups("garmin", "month", datetime.date(2024, 1, 1), datetime.date(2024, 12, 31), ["running"])
+    weekly = activity_store.load_rollups("garmin", "week", datetime.date(2024, 1, 1), datetime.date(2024, 12, 31))
+
+    assert list(monthly["period_start"].dt.month) == [2]
+    assert monthly["distance"].tolist() == [18000.0] and monthly["activity_count"].tolist() == [2]
+    assert set(weekly["activity_type"]) == {"running", "multisport", "cycling"}
+    assert weekly["period_start"].min() == pd.Timestamp("2024-01-29")
+
+def test_rollups_count_repeated_activity_once():
+    """
+    GIVEN a batch of Strava activities where paging returned the same run twice
+    WHEN the batch is upserted into the local store
+    THEN the run should be stored and counted in the rollups only once, as its last copy.
+    """
+    task_tracker.init_db()
+    run = {"id": 7, "type": "Run", "start_date_local": "2024-05-02T07:00:00Z", "distance": 5000.0, "moving_time": 1500}
+    activity_store.upsert_activities("strava", [run, {**run, "distance": 5100.0}], "id", "start_date_local")
+
+    monthly = activity_store.load_rollups("strava", "month", datetime.date(2024, 1, 1), datetime.date(2024, 12, 31))
+
+    assert monthly["activity_count"].tolist() == [1] and monthly["distance"].tolist() == [5100.0]
+    assert activity_store.load_activity_records("strava", datetime.date(2024, 5, 1), datetime.date(2024, 5, 31))[0]["distance"] == 5100.0
+
+def test_sync_after_a_gap_fetches_from_high_water_mark(monkeypatch):
+    """
+    GIVEN a local activity store synced for January
+    WHEN sync_activities() is called for a range in March
+    THEN it should fetch from the January high-water mark minus the overlap window,
+         so February is stored before the synced range is extended over it.
+    """
+    task_tracker.init_db()
+    activity_store.set_sync_state("garmin", datetime.date(2024, 1, 1), datetime.date(2024, 1, 31))
+    calls = []
+
+    def fake_fetch_data(start_date, end_date, creds=None, **kwargs):
+        calls.append((start_date, end_date))
+        return pd.DataFrame([{"activityId": 1, "activityType": {"typeKey": "running"}, "startTimeLocal": "2024-02-14 10:00:00", "distance": 5000.0}])
+
+    monkeypatch.setattr(garmin_connect, "fetch_data", fake_fetch_data)
+    garmin_connect.sync_activities(datetime.date(2024, 3, 1), datetime.date(2024, 3, 10))
+
+    assert calls == [(datetime.date(2024, 1, 31) - datetime.timedelta(days=garmin_connect.SYNC_OVERLAP_DAYS), datetime.date(2024, 3, 10))]
+    assert activity_store.get_sync_state("garmin") == (datetime.date(2024, 1, 1), datetime.date(2024, 3, 10))
+    assert len(activity_store.load_activity_records("garmin", datetime.date(2024, 2, 1), datetime.date(2024, 2, 29))) == 1
@@ -0,0 +1,44 @@
+# Import required libraries
+import os
+import sys
+import time
+import datetime
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import activity_store
+import backfill
+import rate_limit
+
+def test_backfill_resumes_after_rate_limit(monkeypatch):
+    """
+    GIVEN a backfill over four monthly slices where Garmin Connect rate limits the third slice
+    WHEN the backfill is run, and then run again
+    THEN the first run should stop after two slices and the second should only fetch the remaining two.
+    """
+    fetched = []
+    rate_limited = {"once": True}
+
+    def fake_slice(slice_start, slice_end, creds):
+        if slice_start.month == 3 and rate_limited.pop("once", False):
+            raise rate_limit.RateLimitDeferred("garmin", time.time() + 60)
+        fetched.append(slice_start.month)
+        return 1
+
+    monkeypatch.setattr(backfill, "backfill_garmin_slice", fake_slice)
+    start, end = datetime.date(2023, 1, 1), datetime.date(2023, 4, 30)
+
+    assert backfill.backfill(start, end, sources=("garmin",), slice_days=31) == 2
+    assert backfill.backfill(start, end, sources=("garmin",), slice_days=31) == 2
+    assert fetched == [1, 2, 3, 4]
+    assert activity_store.get_sync_state("garmin") == (start, end)
+
+def test_date_slices_cover_range_without_gaps():
+    slices = list(backfill.date_slices(datetime.date(2024, 1, 1), datetime.date(2024, 1, 10), slice_days=4))
+    assert slices == [
+        (datetime.date(2024, 1, 1), datetime.date(2024, 1, 4)),
+        (datetime.date(2024, 1, 5), datetime.date(2024, 1, 8)),
+        (datetime.date(2024, 1, 9), datetime.date(2024, 1, 10)),
+    ]
@@ -0,0 +1,49 @@
+# Import required libraries
+import os
+import sys
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+from benchmarks import synthetic, hot_paths
+
+def test_synthetic_activities_mirror_garmin_connect_and_strava_payloads():
+    """
+    GIVEN a request for 500 synthetic activities
+    WHEN Garmin Connect and Strava payloads are generated
+    THEN they should have nested activity types, triathlon laps and a Strava copy of most activities.
+    """
+    garmin = synthetic.generate_garmin_activities(500)
+    strava = synthetic.generate_strava_activities(garmin)
+
+    assert len(garmin) == 500 and 400 < len(strava) < 500
+    assert all(isinstance(a["activityType"], dict) for a in garmin)
+    assert any(len(a.get("laps", [])) == len(synthetic.TRIATHLON_LEGS) for a in garmin)
+    assert garmin == synthetic.generate_garmin_activities(500)
+
+def test_hot_path_benchmark_measures_every_stage():
+    """
+    GIVEN a small synthetic benchmark run without rendering
+    WHEN run() is called
+    THEN it should report time and peak memory for every other stage.
+    """
+    stages = ["project_garmin_schema", "filter_running_activities", "match_activities", "store_with_rollups", "running_summary"]
+    results = hot_paths.run(sizes=[200], stages=stages)
+
+    assert [r["stage"] for r in results] == stages
+    assert all(r["seconds"] > 0 and r["peak_mb"] > 0 for r in results)
+
+def test_hot_path_stages_never_touch_the_real_tracker_database(monkeypatch, tmp_path):
+    """
+    GIVEN a tracker database path outside the benchmark work directory
+    WHEN run() measures only the stages reading the rollups
+    THEN they should read the activities from the work database and leave the tracker database untouched.
+    """
+    tracker_db = tmp_path / "sync_tracker.db"
+    monkeypatch.setattr(hot_paths.task_tracker, "DB_PATH", str(tracker_db))
+
+    results = hot_paths.run(sizes=[200], memory=False, stages=["running_summary"])
+
+    assert [r["stage"] for r in results] == ["running_summary"]
+    assert not tracker_db.exists() and hot_paths.task_tracker.DB_PATH == str(tracker_db)
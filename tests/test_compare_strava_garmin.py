@@ -0,0 +1,33 @@
+# Import required libraries
+import os
+import sys
+import pandas as pd
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import compare_strava_garmin
+
+def test_match_activities_tolerates_clock_skew():
+    """
+    GIVEN a run recorded on both services with 45 seconds of clock skew,
+          a Garmin Connect ride with a different Strava activity a minute later, and a Strava-only activity
+    WHEN match_activities() is called
+    THEN the run should match with high confidence and the others should be reported as missing from one side.
+    """
+    garmin_df = compare_strava_garmin.normalise_garmin(pd.DataFrame([
+        {"activityId": 1, "activityName": "Run", "startTimeLocal": "2024-01-01 10:00:00", "duration": 1800, "distance": 5000},
+        {"activityId": 2, "activityName": "Ride", "startTimeLocal": "2024-01-03 07:00:00", "duration": 3600, "distance": 30000},
+    ]))
+    strava_df = compare_strava_garmin.normalise_strava(pd.DataFrame([
+        {"id": 10, "name": "Run", "start_date_local": "2024-01-01T10:00:45Z", "elapsed_time": 1790, "distance": 5010},
+        {"id": 11, "name": "Walk", "start_date_local": "2024-01-03T07:01:00Z", "elapsed_time": 600, "distance": 100},
+    ]))
+
+    result = compare_strava_garmin.match_activities(garmin_df, strava_df)
+
+    assert list(zip(result["matched"]["garmin_id"], result["matched"]["strava_id"])) == [(1, 10)]
+    assert result["matched"]["confidence"].iloc[0] > 0.8
+    assert list(result["garmin_only"]["id"]) == [2]
+    assert list(result["strava_only"]["id"]) == [11]
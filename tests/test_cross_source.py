@@ -0,0 +1,51 @@
+# Import required libraries
+import os
+import sys
+import time
+import pandas as pd
+import pytest
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import cross_source
+
+def test_fetch_garmin_and_strava_runs_both_fetches_at_once(monkeypatch):
+    """
+    GIVEN Garmin Connect and Strava fetches that each take 0.3 seconds
+    WHEN fetch_garmin_and_strava() is called
+    THEN both dataframes should be returned in about the time of the slower fetch.
+    """
+    def fake_fetch_data(start_date, end_date, creds=None):
+        time.sleep(0.3)
+        return pd.DataFrame([{"activityId": 1}])
+
+    def fake_get_latest_activities(days, delta=False):
+        time.sleep(0.3)
+        return pd.DataFrame([{"id": 2}])
+
+    monkeypatch.setattr(cross_source, "fetch_data", fake_fetch_data)
+    monkeypatch.setattr(cross_source, "get_latest_activities", fake_get_latest_activities)
+
+    started = time.monotonic()
+    garmin_df, strava_df = cross_source.fetch_garmin_and_strava(days=7)
+
+    assert time.monotonic() - started < 0.55
+    assert list(garmin_df["activityId"]) == [1]
+    assert list(strava_df["id"]) == [2]
+
+def test_fetch_concurrently_raises_when_a_source_times_out():
+    """
+    GIVEN a Strava fetch that takes longer than its timeout
+    WHEN fetch_concurrently() is called
+    THEN it should raise a RuntimeError naming Strava without waiting for the slow fetch.
+    """
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="strava"):
+        cross_source.fetch_concurrently(
+            {"garmin": lambda: "garmin", "strava": lambda: time.sleep(1)},
+            timeouts={"strava": 0.1},
+        )
+
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,93 @@
+# Import required libraries
+import os
+import sys
+import datetime
+import webbrowser
+import pytest
+import pandas as pd
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import task_tracker
+import activity_store
+import dashboard
+
+def make_activities():
+    """Build Garmin Connect activities with a triathlon, a plain run and a multisport without laps."""
+    return pd.DataFrame([
+        {"activityId": 1, "activityType": {"typeKey": "multisport"}, "startTimeLocal": "2024-01-01 10:00:00", "laps": [
+            {"activityType": {"typeKey": "lap_swimming"}, "distance": 1500},
+            {"activityType": {"typeKey": "cycling"}, "distance": 40000},
+            {"activityType": {"typeKey": "running"}, "distance": 10000},
+        ]},
+        {"activityId": 2, "activityType": {"typeKey": "running"}, "startTimeLocal": "2024-02-01 10:00:00", "distance": 5000},
+        {"activityId": 3, "activityType": {"typeKey": "multisport"}, "startTimeLocal": "2024-02-03 10:00:00", "laps": None},
+    ])
+
+def test_explode_laps_builds_flat_lap_table():
+    """
+    GIVEN activities including a triathlon with swim, bike and run laps
+    WHEN explode_laps() is called
+    THEN it should return one row per lap with its lowercase type key and distance.
+    """
+    laps = dashboard.explode_laps(make_activities())
+
+    assert list(laps["lapTypeKey"]) == ["lap_swimming", "cycling", "running"]
+    assert list(laps["distance"]) == [1500, 40000, 10000]
+    assert set(laps["activityId"]) == {1}
+
+def test_filter_running_activities_includes_multisport_legs():
+    """
+    GIVEN a plain run and a triathlon with a 10 km running leg
+    WHEN filter_running_activities() is called
+    THEN both should be counted in the month they happened.
+    """
+    df_running = dashboard.filter_running_activities(make_activities())
+
+    monthly = df_running.groupby("month")["distance_km"].sum()
+    assert monthly[pd.Period("2024-01")] == 10
+    assert monthly[pd.Period("2024-02")] == 5
+
+def test_generate_dashboard_reuses_render_when_data_is_unchanged(monkeypatch, tmp_path):
+    """
+    GIVEN the same running activities on two scheduled runs, and a new run on the third
+    WHEN generate_dashboard() is called three times, and once more to show the plot
+    THEN the figure should be rendered on the first and third run only, and shown from the saved image.
+    """
+    year = datetime.date.today().year
+    activities = make_activities()
+    activities["startTimeLocal"] = activities["startTimeLocal"].str.replace("2024", str(year))
+    batches = [activities.to_dict("records"), [], [{
+        "activityId": 4, "activityType": {"typeKey": "running"}, "startTimeLocal": f"{year}-01-10 10:00:00", "distance": 8000,
+    }]]
+    renders = []
+
+    def fake_sync_activities(*args, **kwargs):
+        return activity_store.upsert_activities("garmin", batches.pop(0), "activityId", "startTimeLocal")
+
+    def fake_render(dashboard_path, *args, **kwargs):
+        renders.append(dashboard_path)
+        with open(dashboard_path, "wb") as f:
+            f.write(b"PNG")
+
+    task_tracker.init_db()
+    monkeypatch.setattr(dashboard, "OUTPUTS_DIR", tmp_path)
+    monkeypatch.setattr(dashboard, "sync_activities", fake_sync_activities)
+    monkeypatch.setattr(dashboard, "render_dashboard", fake_render)
+
+    dashboard.generate_dashboard(show_plot=False)
+    dashboard.generate_dashboard(show_plot=False)
+    dashboard.generate_dashboard(show_plot=False)
+
+    assert len(renders) == 2
+
+    # Showing an unchanged dashboard opens the saved image without loading matplotlib
+    opened = []
+    batches.append([])
+    monkeypatch.setattr(dashboard, "load_pyplot", lambda: pytest.fail("matplotlib should not be loaded"))
+    monkeypatch.setattr(webbrowser, "open", opened.append)
+    dashboard.generate_dashboard(show_plot=True)
+
+    assert len(renders) == 2 and opened == [(tmp_path / "run_distance.png").resolve().as_uri()]
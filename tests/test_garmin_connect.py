@@ -2,11 +2,14 @@
 import os
 import sys
 import datetime
+import pandas as pd
 
 # Ensure parent directory is on sys path so it can import script functionality
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 # Import modules after patching
+import retry
+import task_tracker
 import garmin_connect
 
 # The actual unit tests start here
@@ -20,7 +23,7 @@ def test_fetch_data_returns_dataframe(tmp_path):
     creds = {"GARMIN_USER": "u", "GARMIN_PASS": "p"}
     start = datetime.date(2024, 1, 1)
     end = datetime.date(2024, 1, 2)
-    _, df = garmin_connect.fetch_data(start, end, creds)
+    df = garmin_connect.fetch_data(start, end, creds)
 
     assert not df.empty, "Expected at least one activity in DataFrame"
     assert "activityId" in df.columns, "Missing expected column from activity data"
@@ -45,3 +48,126 @@ def test_upload_activity_failure(tmp_path):
     """
     creds = {"GARMIN_USER": "u", "GARMIN_PASS": "p"}
     assert garmin_connect.upload_activity_file_to_garmin("fail.fit", creds) is False
+
+
+def test_upload_skips_identical_file_and_accepts_duplicates(tmp_path, monkeypatch):
+    """
+    GIVEN a FIT file that has already been uploaded once
+    WHEN the same content is uploaded again from another path, or Garmin Connect reports a duplicate
+    THEN both uploads should count as successful without a second network upload.
+    """
+    monkeypatch.setattr(task_tracker, "DB_PATH", str(tmp_path / "test_sync_tracker.db"))
+    creds = {"GARMIN_USER": "u", "GARMIN_PASS": "p"}
+    api = garmin_connect.get_api(creds)
+    uploads = []
+
+    def fake_upload(file_path):
+        uploads.append(file_path)
+        if "other" in str(file_path):
+            raise garmin_connect.GarminConnectConnectionError("API Error 409 - Duplicate Activity.")
+        return True
+
+    monkeypatch.setattr(api, "upload_activity", fake_upload)
+
+    first = tmp_path / "ride.fit"
+    first.write_bytes(b"FIT-DATA")
+    copy = tmp_path / "ride-copy.fit"
+    copy.write_bytes(b"FIT-DATA")
+    other = tmp_path / "other.fit"
+    other.write_bytes(b"OTHER-DATA")
+
+    assert garmin_connect.upload_activity_file_to_garmin(str(first), creds) is True
+    assert garmin_connect.upload_activity_file_to_garmin(str(copy), creds) is True
+    assert garmin_connect.upload_activity_file_to_garmin(str(other), creds) is True
+    assert garmin_connect.upload_activity_file_to_garmin(str(other), creds) is True
+    assert uploads == [str(first), str(other)]
+
+
+def test_garmin_client_errors_are_not_retried():
+    """
+    GIVEN Garmin Connect errors raised the way the library raises them, with the status code only in the message
+    WHEN is_transient_garmin_error() checks them
+    THEN client errors should not be retried, while server errors and dropped connections should.
+    """
+    error = garmin_connect.GarminConnectConnectionError
+
+    assert not garmin_connect.is_transient_garmin_error(error("API Error 409 - Duplicate Activity."))
+    assert not garmin_connect.is_transient_garmin_error(error("API Error 404 - Not Found"))
+    assert garmin_connect.is_transient_garmin_error(error("API Error 503 - Service Unavailable"))
+    assert garmin_connect.is_transient_garmin_error(error("Connection error: connection reset by peer"))
+
+def test_prepare_dataframe_is_categorical_and_idempotent():
+    """
+    GIVEN raw Garmin Connect activities with nested and missing activity types
+    WHEN prepare_dataframe() is called, and then called again on its own result
+    THEN type keys and Norwegian names should be categorical and the second call should return the same frame.
+    """
+    df = pd.DataFrame([
+        {"activityId": 1, "activityType": {"typeKey": "running"}, "startTimeLocal": "2024-01-01 10:00:00", "duration": 1800},
+        {"activityId": 2, "activityType": None, "startTimeLocal": "2024-01-02 10:00:00", "duration": None},
+    ])
+
+    prepared = garmin_connect.prepare_dataframe(df)
+
+    assert list(prepared["activityTypeKey"]) == ["running", "unknown"]
+    assert list(prepared["activityTypeNameNo"]) == ["løping", "annet"]
+    assert isinstance(prepared["activityTypeNameNo"].dtype, pd.CategoricalDtype)
+    assert "activityTypeKey" not in df.columns
+    assert garmin_connect.prepare_dataframe(prepared) is prepared
+
+
+def test_fetch_data_projects_compact_schema():
+    """
+    GIVEN the Garmin Connect API returning a raw activity with a nested activityType
+    WHEN fetch_data() is called with the default compact schema and with keep_raw enabled
+    THEN the frame should hold typed columns with a flat type key, and other fields only in the raw blob.
+    """
+    creds = {"GARMIN_USER": "u", "GARMIN_PASS": "p"}
+    df = garmin_connect.fetch_data(datetime.date(2024, 1, 1), datetime.date(2024, 1, 2), creds, keep_raw=True)
+
+    assert "activityType" not in df.columns
+    assert df["activityTypeKey"].dtype == "category"
+    assert pd.api.types.is_datetime64_any_dtype(df["startTimeLocal"])
+    assert df["duration"].iloc[0] == 1800
+    assert df["raw"].iloc[0] == "{}"
+    assert garmin_connect.prepare_dataframe(df)["activityTypeNameNo"].iloc[0] == "løping"
+
+
+def test_fetch_data_retries_only_the_failed_page(monkeypatch):
+    """
+    GIVEN a Garmin Connect account with 250 activities where the second page fails once with a server error
+    WHEN fetch_data() is called
+    THEN only the failed page should be requested again, and every activity returned.
+    """
+    creds = {"GARMIN_USER": "u", "GARMIN_PASS": "p"}
+    api = garmin_connect.get_api(creds)
+    search = api.connectapi
+    starts = []
+
+    def flaky_search(path, params=None):
+        starts.append(params["start"])
+        if starts.count("100") == 1 and params["start"] == "100":
+            raise garmin_connect.GarminConnectConnectionError("API Error 503 - Service Unavailable")
+        return search(path, params=params)
+
+    monkeypatch.setattr(api, "connectapi", flaky_search)
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+
+    df = garmin_connect.fetch_data(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31), creds)
+
+    assert starts == ["0", "100", "100", "200"]
+    assert len(df) == 250
+
+def test_iter_activity_chunks_pages_in_bounded_chunks():
+    """
+    GIVEN a Garmin Connect account with 250 activities in the date range
+    WHEN iter_activity_chunks() is called with a chunk size of 100
+    THEN it should yield chunks of 100, 100 and 50 activities, and stop early when the consumer stops.
+    """
+    creds = {"GARMIN_USER": "u", "GARMIN_PASS": "p"}
+    chunks = garmin_connect.iter_activity_chunks(datetime.date(2020, 1, 1), datetime.date(2024, 12, 31), creds, chunk_size=100)
+
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+    first = next(garmin_connect.iter_activity_chunks(datetime.date(2020, 1, 1), datetime.date(2024, 12, 31), creds, chunk_size=10))
+    assert list(first["activityId"]) == list(range(10))
@@ -0,0 +1,63 @@
+# Import required libraries
+import os
+import sys
+import datetime
+import pytest
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import http_cache
+import garmin_connect
+import strava
+
+@pytest.fixture
+def cache_dir(monkeypatch, tmp_path):
+    """Monkeypatch the cache directory to a temporary directory for testing."""
+    monkeypatch.setattr(http_cache, "CACHE_DIR", tmp_path)
+    return tmp_path
+
+def test_cache_mode_reuses_fresh_responses_and_refetches_expired_ones(cache_dir):
+    """
+    GIVEN an immutable request and a volatile request with a one minute TTL
+    WHEN both are requested again two minutes later in cache mode
+    THEN the immutable response should come from the cache and the volatile one be fetched again.
+    """
+    fetches = []
+
+    def fetch(name):
+        fetches.append(name)
+        return {"name": name}
+
+    for now in (0, 120):
+        http_cache.cached_response("strava", {"path": "/activities/1/streams"}, lambda: fetch("streams"), ttl=None, mode="cache", now=now)
+        http_cache.cached_response("strava", {"path": "/athlete/activities"}, lambda: fetch("list"), ttl=60, mode="cache", now=now)
+
+    assert fetches == ["streams", "list", "list"]
+
+def test_replay_mode_serves_recorded_responses_without_network(cache_dir, monkeypatch):
+    """
+    GIVEN Garmin Connect activities and Strava streams recorded in record mode
+    WHEN the same requests are made in replay mode with every API call failing
+    THEN the recorded responses should be returned, and an unrecorded request should raise CacheMiss.
+    """
+    day = datetime.date(2024, 1, 1)
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_MODE", "record")
+    monkeypatch.setattr(strava, "TOKEN_MANAGER", type("Tokens", (), {"headers": lambda self: {}})())
+    monkeypatch.setattr(strava, "with_retries", lambda send, description=None: {"heartrate": {"data": [120]}})
+    recorded = garmin_connect.fetch_data(day, day, {"GARMIN_USER": "u", "GARMIN_PASS": "p"})
+    strava.get_stream(42)
+
+    def offline(*args, **kwargs):
+        raise AssertionError("No network calls expected in replay mode")
+
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_MODE", "replay")
+    monkeypatch.setattr(garmin_connect, "garmin_request", offline)
+    monkeypatch.setattr(strava, "with_retries", offline)
+    replayed = garmin_connect.fetch_data(day, day, {"GARMIN_USER": "u", "GARMIN_PASS": "p"})
+
+    assert replayed.equals(recorded)
+    assert strava.get_stream(42) == {"heartrate": {"data": [120]}}
+    with pytest.raises(http_cache.CacheMiss):
+        strava.get_stream(43)
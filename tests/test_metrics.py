@@ -0,0 +1,77 @@
+# Import required libraries
+import os
+import sys
+import json
+import pytest
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import metrics
+
+@pytest.fixture
+def metrics_dirs(tmp_path, monkeypatch):
+    """Write run metrics to temporary directories and start from empty metrics."""
+    monkeypatch.setattr(metrics, "METRICS_DIR", tmp_path / "metrics")
+    monkeypatch.setattr(metrics, "METRICS_TEXTFILE_DIR", tmp_path / "textfile")
+    metrics.METRICS.reset()
+    yield tmp_path
+    metrics.METRICS.reset()
+
+def test_span_records_latency_histogram_and_errors(metrics_dirs):
+    """
+    GIVEN spans that finish quickly, one of them raising
+    WHEN the run summary is taken
+    THEN every span should be counted in the histogram, and the failure counted as an error.
+    """
+    for _ in range(2):
+        with metrics.span("garmin_request", call="get_activities_by_date"):
+            pass
+    with pytest.raises(ValueError):
+        with metrics.span("garmin_request", call="get_activities_by_date"):
+            raise ValueError("boom")
+
+    summary = metrics.METRICS.summary("test")
+    span = summary["spans"][0]
+    assert span["name"] == "garmin_request" and span["labels"] == {"call": "get_activities_by_date"}
+    assert span["count"] == 3 and sum(span["buckets"].values()) == 3
+    assert {"name": "garmin_request_errors", "labels": {"call": "get_activities_by_date"}, "value": 1} in summary["counters"]
+
+def test_run_metrics_writes_history_and_prometheus_textfile(metrics_dirs):
+    """
+    GIVEN a run that parses records and counts bytes
+    WHEN the run ends
+    THEN its summary should be appended to the JSON history and written as a Prometheus textfile.
+    """
+    for _ in range(2):
+        with metrics.run_metrics("garmin_connect"):
+            with metrics.span("parse_records"):
+                metrics.increment("records_parsed", 10)
+            metrics.increment("strava_response_bytes", 512, endpoint="/activities/{id}")
+
+    history = (metrics_dirs / "metrics" / "garmin_connect.jsonl").read_text().splitlines()
+    assert len(history) == 2
+    summary = json.loads(history[-1])
+    assert {s["name"] for s in summary["spans"]} == {"run", "parse_records"}
+    assert {"name": "records_parsed", "labels": {}, "value": 10} in summary["counters"]
+
+    text = (metrics_dirs / "textfile" / "garmin_connect.prom").read_text()
+    assert 'garmin_strava_span_seconds_count{span="parse_records"} 1' in text
+    assert 'garmin_strava_span_seconds_bucket{span="parse_records",le="+Inf"} 1' in text
+    assert 'garmin_strava_strava_response_bytes_total{endpoint="/activities/{id}"} 512' in text
+    assert 'garmin_strava_run_duration_seconds{run="garmin_connect"}' in text
+    assert not list((metrics_dirs / "textfile").glob("*.tmp"))
+
+def test_run_metrics_saved_when_run_fails(metrics_dirs):
+    """
+    GIVEN a run that raises an error
+    WHEN the run ends
+    THEN the error should propagate and the run should still be saved with the failure counted.
+    """
+    with pytest.raises(RuntimeError):
+        with metrics.run_metrics("backfill"):
+            raise RuntimeError("Garmin Connect unavailable")
+
+    summary = json.loads((metrics_dirs / "metrics" / "backfill.jsonl").read_text())
+    assert {"name": "run_errors", "labels": {}, "value": 1} in summary["counters"]
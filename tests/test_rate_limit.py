@@ -0,0 +1,99 @@
+# Import required libraries
+import os
+import sys
+import datetime
+import threading
+import pytest
+import requests
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import task_tracker
+import rate_limit
+import garmin_connect
+
+def test_budget_is_shared_between_concurrent_callers(monkeypatch):
+    """
+    GIVEN a Strava budget of ten requests per 15 minutes
+    WHEN twelve callers on separate database connections reserve a request in the same window
+    THEN nine should get a request straight away and the rest wait until the window resets.
+    """
+    monkeypatch.setitem(rate_limit.RATE_LIMITS, "strava", [("15min", 10, 900), ("daily", 1000, 86400)])
+    waits = []
+
+    def reserve():
+        waits.append(rate_limit.reserve("strava", now=1000))
+        task_tracker.close_connection()
+
+    threads = [threading.Thread(target=reserve) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(waits) == [0] * 9 + [800] * 3
+
+def test_reported_usage_and_daily_window_limit_the_budget():
+    """
+    GIVEN Strava reporting the daily limit used up by another app on the same account
+    WHEN a request is reserved later the same day
+    THEN it should wait until the daily window resets at midnight UTC.
+    """
+    rate_limit.record_usage("strava", [100, 1000], [5, 1000], now=3600)
+
+    assert rate_limit.reserve("strava", now=3600) == 86400 - 3600
+
+def test_garmin_back_off_doubles_and_defers_long_waits():
+    """
+    GIVEN two 429 responses from Garmin Connect in a row
+    WHEN the back-off is recorded and a job asks for a request
+    THEN the back-off should double, and a job unwilling to wait that long should be deferred.
+    """
+    first = rate_limit.record_rate_limited("garmin")
+    second = rate_limit.record_rate_limited("garmin")
+
+    assert second == 2 * first
+    with pytest.raises(rate_limit.RateLimitDeferred):
+        rate_limit.acquire("garmin", max_wait=1)
+
+def test_only_429_responses_count_as_rate_limited():
+    """
+    GIVEN errors with a 429 response, a Garmin Connect "API Error 429" raised from another error, and an error mentioning 429 in a file name
+    WHEN is_rate_limited() checks them
+    THEN only the rate limit responses should count as rate limited.
+    """
+    response = requests.Response()
+    response.status_code = 429
+    try:
+        try:
+            raise garmin_connect.GarminConnectConnectionError("API Error 429 - Too Many Requests")
+        except garmin_connect.GarminConnectConnectionError as e:
+            raise RuntimeError("Garmin Connect request failed") from e
+    except RuntimeError as e:
+        wrapped = e
+
+    assert rate_limit.is_rate_limited(requests.HTTPError("429 Client Error", response=response))
+    assert rate_limit.is_rate_limited(wrapped)
+    assert not rate_limit.is_rate_limited(garmin_connect.GarminConnectConnectionError("Failed to read file /tmp/x/9876429123.fit"))
+
+def test_garmin_activity_pages_each_take_a_request_from_the_budget():
+    """
+    GIVEN a Garmin Connect account with 250 activities, fetched in pages of 100
+    WHEN fetch_data() is called
+    THEN each of the three pages should take its own request from the shared budget.
+    """
+    def used():
+        with task_tracker.get_connection() as conn:
+            row = conn.execute("SELECT used FROM rate_limits WHERE source = 'garmin'").fetchone()
+        return row[0] if row else 0
+
+    # Log in first, so only the activity pages are counted
+    task_tracker.init_db()
+    creds = {"GARMIN_USER": "u", "GARMIN_PASS": "p"}
+    garmin_connect.get_api(creds)
+    before = used()
+    garmin_connect.fetch_data(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31), creds)
+
+    assert used() - before == 3
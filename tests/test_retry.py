@@ -0,0 +1,83 @@
+# Import required libraries
+import os
+import sys
+import pytest
+import requests
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import retry
+
+def http_error(status, headers=None):
+    """Build a requests HTTPError carrying a response with the given status code and headers."""
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(f"{status} error", response=response)
+
+def test_with_retries_backs_off_and_honours_retry_after(monkeypatch):
+    """
+    GIVEN a call that fails twice with transient errors, once asking to retry after 5 seconds
+    WHEN with_retries() is called
+    THEN it should sleep at least the Retry-After time and return the third result.
+    """
+    sleeps = []
+    monkeypatch.setattr(retry.time, "sleep", sleeps.append)
+    errors = [http_error(503, {"Retry-After": "5"}), requests.ConnectionError("reset")]
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert retry.with_retries(flaky, attempts=3) == "ok"
+    assert len(sleeps) == 2 and sleeps[0] >= 5
+
+def test_with_retries_raises_client_errors_at_once(monkeypatch):
+    """
+    GIVEN a call that fails with a 404 Not Found
+    WHEN with_retries() is called
+    THEN the error should be raised without retrying.
+    """
+    calls = []
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+
+    def missing():
+        calls.append(1)
+        raise http_error(404)
+
+    with pytest.raises(requests.HTTPError):
+        retry.with_retries(missing, attempts=3)
+    assert len(calls) == 1
+
+def test_is_safe_to_repeat_only_for_unsent_or_deferred_requests():
+    """
+    GIVEN errors from a request that is not safe to send twice
+    WHEN is_safe_to_repeat() checks them
+    THEN only a connect timeout or a 429 or 503 with Retry-After should be retried.
+    """
+    assert retry.is_safe_to_repeat(requests.ConnectTimeout("connect timed out"))
+    assert retry.is_safe_to_repeat(http_error(503, {"Retry-After": "2"}))
+    assert not retry.is_safe_to_repeat(http_error(503))
+    assert not retry.is_safe_to_repeat(http_error(502, {"Retry-After": "2"}))
+    assert not retry.is_safe_to_repeat(requests.ReadTimeout("read timed out"))
+
+def test_status_code_follows_wrapped_errors_and_ignores_numbers_in_messages():
+    """
+    GIVEN a Garmin Connect style error raised from an HTTP 503 error, and an error mentioning 500 in its message
+    WHEN status_code() and is_transient() check them
+    THEN the wrapped status code should be found, and the number in the message ignored.
+    """
+    try:
+        try:
+            raise http_error(503)
+        except requests.HTTPError as e:
+            raise RuntimeError("Garmin Connect request failed") from e
+    except RuntimeError as e:
+        wrapped = e
+
+    assert retry.status_code(wrapped) == 503 and retry.is_transient(wrapped)
+    assert retry.status_code(ValueError("gave up after 500 ms")) is None
+    assert not retry.is_transient(ValueError("gave up after 500 ms"))
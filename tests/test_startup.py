@@ -0,0 +1,34 @@
+# Import required libraries
+import os
+import sys
+import json
+import subprocess
+
+# Ensure parent directory is on sys path so it can import script functionality
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# Import modules after patching
+from benchmarks.startup import HEAVY_MODULES
+
+# Snippet run in a fresh interpreter, with the Garmin Connect mock from conftest installed first
+PROBE = f"""
+import sys, json
+sys.path[:0] = [{ROOT!r}, {os.path.join(ROOT, "tests")!r}]
+import conftest
+import garmin_connect, strava, dashboard, backfill
+print(json.dumps(sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules)))
+"""
+
+def test_entry_points_do_not_load_heavy_modules_on_import(tmp_path):
+    """
+    GIVEN the Garmin Connect, Strava, dashboard and backfill entry points
+    WHEN they are imported in a fresh interpreter
+    THEN matplotlib, seaborn and selenium should not be loaded,
+         and no output directories should be created.
+    """
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=tmp_path, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,254 @@
+# Import required libraries
+import os
+import sys
+import datetime
+import threading
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import stream_cache
+import retry
+import strava
+
+def make_activity(activity_id, start):
+    """Build a Strava activity record shaped like the API summary representation."""
+    return {
+        "id": activity_id,
+        "name": f"Ride {activity_id}",
+        "type": "VirtualRide",
+        "start_date": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "start_date_local": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+
+def test_delta_sync_requests_only_newer_activities(monkeypatch):
+    """
+    GIVEN a previous Strava sync that stored the newest activity start date
+    WHEN get_latest_activities() is called again in delta mode
+    THEN it should ask Strava only for activities after that start date
+         and return both stored and newly fetched activities.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    first = make_activity(1, now - datetime.timedelta(days=2))
+    second = make_activity(2, now - datetime.timedelta(hours=1))
+    responses = [[first], [second]]
+    afters = []
+
+    def fake_fetch_activities_after(after):
+        afters.append(after)
+        return responses.pop(0)
+
+    monkeypatch.setattr(strava, "fetch_activities_after", fake_fetch_activities_after)
+
+    strava.get_latest_activities(days=7, delta=True)
+    df = strava.get_latest_activities(days=7, delta=True)
+
+    assert afters[1] == int((now - datetime.timedelta(days=2)).timestamp())
+    assert sorted(df["id"]) == [1, 2]
+
+def test_full_sync_keeps_activities_earlier_on_the_window_start_day(monkeypatch):
+    """
+    GIVEN an activity backfilled just after midnight on the first day of the sync window, without a cursor
+    WHEN get_latest_activities() runs a full sync in delta mode
+    THEN it should fetch from midnight of that day, so the backfilled activity is kept in the store.
+    """
+    window_day = datetime.date.today() - datetime.timedelta(days=7)
+    early = make_activity(1, datetime.datetime.combine(window_day, datetime.time(0, 1)))
+    later = make_activity(2, datetime.datetime.now().replace(microsecond=0) - datetime.timedelta(hours=1))
+    strava.init_db()
+    strava.upsert_activities("strava", [early], "id", "start_date_local")
+    strava.set_sync_state("strava", window_day, window_day)
+    afters = []
+
+    def fake_fetch_activities_after(after):
+        afters.append(after)
+        return [a for a in (early, later) if datetime.datetime.strptime(a["start_date_local"], "%Y-%m-%dT%H:%M:%SZ").timestamp() >= after]
+
+    monkeypatch.setattr(strava, "fetch_activities_after", fake_fetch_activities_after)
+    df = strava.get_latest_activities(days=7, delta=True)
+
+    assert afters == [int(datetime.datetime.combine(window_day, datetime.time.min).timestamp())]
+    assert sorted(df["id"]) == [1, 2]
+
+def test_fetch_pages_collects_every_page_concurrently(monkeypatch):
+    """
+    GIVEN a paginated Strava endpoint with five records and a page size of two
+    WHEN fetch_pages() is called with several workers
+    THEN it should return all records in page order and stop after the short page.
+    """
+    records = list(range(5))
+    requested = []
+
+    def fake_api_get(path, headers, params=None):
+        requested.append(params["page"])
+        start = (params["page"] - 1) * params["per_page"]
+        return records[start:start + params["per_page"]]
+
+    monkeypatch.setattr(strava, "api_get", fake_api_get)
+
+    result = strava.fetch_pages("/athlete/activities", {}, max_workers=3, per_page=2)
+
+    assert result == records
+    assert max(requested) <= 4
+
+def test_fetch_pages_keeps_pages_when_a_page_fails_transiently(monkeypatch):
+    """
+    GIVEN a paginated Strava endpoint where the second page fails once with a 502 Bad Gateway
+    WHEN fetch_pages() is called
+    THEN only the failed page should be retried and every record returned.
+    """
+    records = list(range(5))
+    calls = []
+
+    class FakeResponse:
+        def __init__(self, status, body):
+            self.status_code, self.headers, self.body = status, {}, body
+            self.content = str(body).encode()
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise strava.requests.HTTPError(f"{self.status_code} Bad Gateway", response=self)
+
+        def json(self):
+            return self.body
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append(params["page"])
+        if params["page"] == 2 and calls.count(2) == 1:
+            return FakeResponse(502, None)
+        start = (params["page"] - 1) * params["per_page"]
+        return FakeResponse(200, records[start:start + params["per_page"]])
+
+    monkeypatch.setattr(strava.SESSION, "get", fake_get)
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+
+    result = strava.fetch_pages("/athlete/activities", {}, max_workers=1, per_page=2)
+
+    assert result == records
+    assert calls.count(1) == 1 and calls.count(2) == 2
+
+def test_rate_limiter_waits_for_window_reset_when_exhausted():
+    """
+    GIVEN rate limit headers showing the 15-minute window is used up
+    WHEN the rate limiter is asked for the next delay
+    THEN it should wait until the window resets.
+    """
+    limiter = strava.RateLimiter(headroom=1.0)
+    response = type("Response", (), {"headers": {"X-RateLimit-Limit": "100,1000", "X-RateLimit-Usage": "100,200"}})()
+    limiter.update(response, now=600)
+
+    assert limiter.delay(now=600) == 300
+
+def test_token_manager_refreshes_once_for_concurrent_callers(monkeypatch):
+    """
+    GIVEN an expired Strava token on disk
+    WHEN several threads ask the token manager for a token at the same time
+    THEN the token should be loaded and refreshed only once and shared by every caller.
+    """
+    loads, refreshes = [], []
+    expired = {"access_token": "old", "refresh_token": "r", "expires_at": 0}
+
+    def fake_load_tokens():
+        loads.append(1)
+        return expired
+
+    def fake_refresh_access(token):
+        refreshes.append(1)
+        return {"access_token": "new", "refresh_token": "r", "expires_at": 2 ** 31}
+
+    monkeypatch.setattr(strava, "load_tokens", fake_load_tokens)
+    monkeypatch.setattr(strava, "refresh_access", fake_refresh_access)
+
+    manager = strava.TokenManager()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.headers())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1 and len(refreshes) == 1
+    assert all(h == {"Authorization": "Bearer new"} for h in results)
+
+def test_get_streams_serves_repeat_reads_from_cache(monkeypatch, tmp_path):
+    """
+    GIVEN a stream cache directory and a Strava activity with heart rate and time streams
+    WHEN get_streams() is called twice for the same activity
+    THEN the streams should be fetched once and returned as typed arrays both times.
+    """
+    monkeypatch.setattr(stream_cache, "CACHE_DIR", tmp_path)
+    fetched = []
+
+    def fake_get_stream(activity_id, types):
+        fetched.append(activity_id)
+        return {"heartrate": {"data": [120, 130, 140]}, "time": {"data": [0, 1, 2]}}
+
+    monkeypatch.setattr(strava, "get_stream", fake_get_stream)
+
+    first = strava.get_streams([42], types=("heartrate", "time", "cadence"))
+    second = strava.get_streams([42], types=("heartrate", "time", "cadence"))
+
+    assert fetched == [42]
+    assert second[42]["heartrate"].dtype.name == "int16"
+    assert list(second[42]["time"]) == [0, 1, 2]
+    assert "cadence" not in first[42]
+
+def test_download_activity_files_over_http(tmp_path):
+    """
+    GIVEN an HTTP session carrying Strava login cookies
+    WHEN download_activity_files() is called for two activities and one export returns a web page
+    THEN the file should be saved under its activity ID with the extension from Content-Disposition, and the failed one returned as None.
+    """
+    class FakeResponse:
+        def __init__(self, activity_id):
+            html = activity_id == 2
+            self.headers = {
+                "Content-Type": "text/html" if html else "application/octet-stream",
+                "Content-Disposition": f'attachment; filename="{activity_id}.fit"',
+            }
+
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            yield b"FIT"
+
+    class FakeSession:
+        def get(self, url, **kwargs):
+            return FakeResponse(int(url.split("/")[-2]))
+
+    paths = strava.download_activity_files(FakeSession(), [1, 2], tmp_path, max_workers=2)
+
+    assert paths == [str(tmp_path / "1.fit"), None]
+    assert (tmp_path / "1.fit").read_bytes() == b"FIT"
+
+def test_download_activity_files_keeps_files_with_the_same_original_name(tmp_path):
+    """
+    GIVEN two Strava activities whose exports share the same Content-Disposition file name
+    WHEN download_activity_files() downloads them concurrently
+    THEN each file should be saved under its own activity ID with its own content.
+    """
+    class FakeResponse:
+        def __init__(self, activity_id):
+            self.activity_id = activity_id
+            self.headers = {
+                "Content-Type": "application/octet-stream",
+                "Content-Disposition": 'attachment; filename="Zwift_ride.fit.gz"',
+            }
+
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            yield f"FIT {self.activity_id}".encode()
+
+    class FakeSession:
+        def get(self, url, **kwargs):
+            return FakeResponse(int(url.split("/")[-2]))
+
+    paths = strava.download_activity_files(FakeSession(), [1, 2], tmp_path, max_workers=2)
+
+    assert paths == [str(tmp_path / "1.fit.gz"), str(tmp_path / "2.fit.gz")]
+    assert (tmp_path / "1.fit.gz").read_bytes() == b"FIT 1"
+    assert (tmp_path / "2.fit.gz").read_bytes() == b"FIT 2"
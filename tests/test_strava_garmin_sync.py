@@ -0,0 +1,43 @@
+# Import required libraries
+import os
+import sys
+import pandas as pd
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+import task_tracker
+import strava_garmin_sync
+
+def test_sync_uploads_each_file_as_it_is_downloaded(monkeypatch):
+    """
+    GIVEN three virtual rides on Strava where one download fails and one upload fails
+    WHEN sync_virtual_rides() runs the download and upload pipeline
+    THEN each downloaded file should be uploaded and only the successful upload recorded as synced.
+    """
+    rides = pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"], "type": ["VirtualRide"] * 3})
+    events = []
+
+    def fake_download(df, download_dir=None, on_downloaded=None, **kwargs):
+        for activity_id in df["id"]:
+            events.append(("download", activity_id))
+            if activity_id != 3:
+                on_downloaded(activity_id, f"{download_dir}/{'fail' if activity_id == 2 else 'ok'}-{activity_id}.fit")
+        return []
+
+    def fake_upload(file_path, creds=None):
+        events.append(("upload", file_path))
+        return "fail" not in file_path
+
+    monkeypatch.setattr(strava_garmin_sync, "get_virtual_ride_activities", lambda **kwargs: rides)
+    monkeypatch.setattr(strava_garmin_sync, "download_multiple_activities", fake_download)
+    monkeypatch.setattr(strava_garmin_sync, "upload_activity_file_to_garmin", fake_upload)
+    monkeypatch.setattr(strava_garmin_sync, "get_api", lambda creds=None: None)
+
+    uploaded, failed = strava_garmin_sync.sync_virtual_rides()
+
+    assert (uploaded, failed) == (1, 2)
+    assert task_tracker.is_uploaded_to_garmin("1")
+    assert not task_tracker.is_uploaded_to_garmin("2")
+    assert sum(1 for kind, _ in events if kind == "upload") == 2
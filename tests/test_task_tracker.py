@@ -1,7 +1,6 @@
 # Import required libraries
 import os
 import sys
-import pytest
 
 # Ensure parent directory is on sys path so it can import script functionality
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -9,14 +8,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 # Import modules after patching
 import task_tracker
 
-@pytest.fixture
-def temp_db(monkeypatch, tmp_path):
-    """Monkeypatch the DB_PATH to use a temporary file for testing."""
-    db_file = tmp_path / "test_sync_tracker.db"
-    monkeypatch.setattr(task_tracker, "DB_PATH", str(db_file))
-    return db_file
-
-def test_task_creation_and_upload_tracking(temp_db):
+def test_task_creation_and_upload_tracking():
     # Initialise a clean temporary database
     task_tracker.init_db()
 
@@ -29,3 +21,17 @@ def test_task_creation_and_upload_tracking(temp_db):
     assert not task_tracker.is_uploaded_to_garmin("abc")
     task_tracker.mark_uploaded_to_garmin("abc")
     assert task_tracker.is_uploaded_to_garmin("abc")
+
+def test_bulk_upload_and_task_queries():
+    # Initialise a clean temporary database
+    task_tracker.init_db()
+
+    # Filter a batch of activities against recorded uploads in one query
+    task_tracker.mark_uploaded_to_garmin("1")
+    task_tracker.mark_uploaded_to_garmin("3")
+    assert task_tracker.filter_not_uploaded([1, 2, 3, 4]) == ["2", "4"]
+
+    # Look up existing tasks for a batch of activities
+    task_tracker.mark_task_created("10")
+    task_tracker.mark_task_created("11")
+    assert task_tracker.existing_tasks(["10", "12"]) == {"10"}
@@ -3,11 +3,14 @@ import os
 import sys
 import types
 import pytest
+import requests
 
 # Ensure parent directory is on sys path so it can import script functionality
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 # Import modules after patching
+import retry
+import todoist_integration
 from todoist_integration import create_todoist_task
 
 class MockTodoistAPI:
@@ -26,3 +29,33 @@ def test_create_task(mock_todoist):
     task = create_todoist_task("Test task for Garmin Connect")
     assert task is not None
     assert task.content == "Test task for Garmin Connect"
+
+@pytest.mark.parametrize("error, expected_calls", [
+    (requests.ReadTimeout("read timed out"), 1),
+    (requests.ConnectionError("connection reset"), 1),
+    (requests.ConnectTimeout("connect timed out"), 2),
+])
+def test_create_task_only_retries_requests_that_never_reached_todoist(monkeypatch, error, expected_calls):
+    """
+    GIVEN a Todoist API whose first task creation fails with a timeout or dropped connection
+    WHEN create_todoist_task() is called
+    THEN it should only retry when the request never reached Todoist, so no duplicate task is created.
+    """
+    calls = []
+
+    class FlakyTodoistAPI(MockTodoistAPI):
+        def add_task(self, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise error
+            return super().add_task(**kwargs)
+
+    monkeypatch.setattr(todoist_integration, "TodoistAPI", FlakyTodoistAPI)
+    monkeypatch.setattr(todoist_integration, "check_todoist_credentials", lambda: {
+        "TODOIST_API_TOKEN": "token", "TODOIST_SECTION_ID": "section", "TODOIST_PROJECT_ID": "project"
+    })
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+
+    create_todoist_task("Test task for Garmin Connect")
+
+    assert len(calls) == expected_calls
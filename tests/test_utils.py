@@ -0,0 +1,34 @@
+# Import required libraries
+import os
+import sys
+import threading
+
+# Ensure parent directory is on sys path so it can import script functionality
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import modules after patching
+from utils import DownloadWatcher
+
+def test_download_watcher_ignores_partial_files(tmp_path):
+    """
+    GIVEN a download directory being watched
+    WHEN the browser writes a partial .crdownload file and then renames it to the final name
+    THEN the watcher should return only the finished file.
+    """
+    (tmp_path / "existing.fit").write_bytes(b"old")
+    watcher = DownloadWatcher(tmp_path)
+
+    def simulate_download():
+        partial = tmp_path / "ride.fit.crdownload"
+        partial.write_bytes(b"data")
+        partial.rename(tmp_path / "ride.fit")
+
+    timer = threading.Timer(0.2, simulate_download)
+    timer.start()
+    try:
+        file_path = watcher.wait_for_file(timeout=5)
+    finally:
+        timer.join()
+        watcher.close()
+
+    assert file_path == str(tmp_path / "ride.fit")
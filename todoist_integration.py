@@ -3,30 +3,33 @@ from todoist_api_python.api import TodoistAPI
 
 # Import shared configuration and functions from other scripts
 from config import logger, check_todoist_credentials
-
-# Get credentials and run credentials check
-creds = check_todoist_credentials()
-TODOIST_SECTION_ID = creds["TODOIST_SECTION_ID"]
-TODOIST_PROJECT_ID = creds["TODOIST_PROJECT_ID"]
-TODOIST_API_TOKEN = creds["TODOIST_API_TOKEN"]
+from retry import with_retries, is_safe_to_repeat
+from metrics import span
 
 
 def create_todoist_task(content, due_string="today"):
     """Create a Todoist task with a Garmin Connect label."""
-    if not TODOIST_API_TOKEN:
+    # Get credentials and run credentials check when a task is created, not on import
+    creds = check_todoist_credentials()
+    if not creds["TODOIST_API_TOKEN"]:
         logger.warning("No Todoist API token found in environment variables")
         return None
 
-    api = TodoistAPI(TODOIST_API_TOKEN)
+    api = TodoistAPI(creds["TODOIST_API_TOKEN"])
 
     try:
-        task = api.add_task(
-            content=content,
-            section_id=TODOIST_SECTION_ID,
-            project_id=TODOIST_PROJECT_ID,
-            due_string=due_string,
-            labels=["Garmin Connect App"]
-        )
+        # Creating a task is not safe to repeat, as a timed out request may already have created it
+        with span("todoist_create_task"):
+            task = with_retries(
+                api.add_task,
+                retryable=is_safe_to_repeat,
+                description="Todoist task creation",
+                content=content,
+                section_id=creds["TODOIST_SECTION_ID"],
+                project_id=creds["TODOIST_PROJECT_ID"],
+                due_string=due_string,
+                labels=["Garmin Connect App"]
+            )
         logger.info("Created the Todoist task: %s", task.content)
         return task
     except Exception as error:
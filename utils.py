@@ -1,9 +1,23 @@
 # Import required libraries
 import os
+import sys
 import time
 import json
+import hashlib
+import select
+import ctypes
+import ctypes.util
 from pathlib import Path
 
+# File suffixes used by browsers while a download is still in progress
+PARTIAL_DOWNLOAD_SUFFIXES = (".crdownload", ".part", ".tmp", ".download")
+
+# Linux inotify flags for files that are finished writing or renamed into place
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
 
 def ensure_dir(path):
     """Ensure directory exists."""
@@ -33,6 +47,12 @@ def safe_json_write(given_path, data, logger, indent=2):
         raise
 
 
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file, reading it in chunks rather than all at once."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
 def save_debug_screenshot(driver, logger, DEBUG_SCREENSHOTS, label="screenshot"):
     """Capture screenshot with Selenium and save to current directory, if activated."""
     if str(DEBUG_SCREENSHOTS).upper() != "ON":
@@ -47,3 +67,71 @@ def save_debug_screenshot(driver, logger, DEBUG_SCREENSHOTS, label="screenshot")
     except Exception as e:
         logger.warning("Failed to save debug screenshot: %s", e, exc_info=True)
         return None
+
+
+class DownloadWatcher:
+    """Detect finished downloads in a directory, using inotify on Linux and a tight poll elsewhere."""
+
+    def __init__(self, directory, poll_interval=0.1):
+        self.directory = Path(directory)
+        self.poll_interval = poll_interval
+        self.seen = set(self._finished_files())
+        self.fd = self._start_inotify()
+
+    def _start_inotify(self):
+        """Start an inotify watch on the directory, returning None if it is not available."""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            if libc.inotify_add_watch(fd, str(self.directory).encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def _finished_files(self):
+        """Return names of files in the directory that are not partial downloads."""
+        return {
+            entry.name for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.endswith(PARTIAL_DOWNLOAD_SUFFIXES)
+        }
+
+    def _drain_events(self, timeout):
+        """Block until an inotify event arrives or the timeout passes, then discard pending events."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait_for_file(self, timeout=60):
+        """Return the path of the next finished file in the directory, or None if the timeout passes."""
+        deadline = time.monotonic() + timeout
+        while True:
+            # Check the directory itself every time, so files finished before an event was read are not missed
+            new_files = sorted(self._finished_files() - self.seen)
+            if new_files:
+                self.seen.add(new_files[0])
+                return str(self.directory / new_files[0])
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if self.fd is not None:
+                self._drain_events(remaining)
+            else:
+                time.sleep(min(self.poll_interval, remaining))
+
+    def close(self):
+        """Stop watching the directory."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -1,7 +1,9 @@
 # Import required libraries
 import smtplib
 from email.message import EmailMessage
-from config import logger, load_env
+from config import logger, configure_logging, load_env
+from dashboard import generate_weekly_running_status
+from metrics import run_metrics
 
 
 def send_email(subject, body):
@@ -35,6 +37,7 @@ def main():
     Weekly running status – {status['year']}
 
     Total distance so far: {status['total_km']} km
+    Distance this week: {status['week_km']} km
     Yearly goal: {status['goal_km']} km
 
     Expected by now: {status['expected_km_by_now']} km
@@ -47,3 +50,9 @@ def main():
         subject=f"Running status week {status['weeks_passed']}",
         body=body.strip()
     )
+
+
+if __name__ == "__main__":
+    configure_logging()
+    with run_metrics("weekly_report"):
+        main()